@@ -0,0 +1,81 @@
+"""
+SOVRA Autonomy - JSON Utilities
+Extracts JSON payloads from free-form LLM responses.
+"""
+
+import re
+from typing import AsyncIterator
+
+import orjson
+
+# Fenced code block: ```json ... ``` or ``` ... ```
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+# Outermost object or array, for JSON surrounded by prose
+_OBJ_RE = re.compile(r"[\{\[].*[\}\]]", re.DOTALL)
+
+
+def parse_llm_json(text: str):
+    """
+    Parse JSON from an LLM response.
+    Tries the raw text first, then a fenced code block, then the outermost
+    object/array. Raises orjson.JSONDecodeError (a json.JSONDecodeError
+    subclass) if nothing parses.
+    """
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError as e:
+        error = e
+
+    match = _FENCE_RE.search(text)
+    if match:
+        try:
+            return orjson.loads(match.group(1))
+        except orjson.JSONDecodeError as e:
+            error = e
+
+    match = _OBJ_RE.search(text)
+    if match:
+        return orjson.loads(match.group(0))
+
+    raise error
+
+
+async def collect_json_object(tokens: AsyncIterator[str]) -> str:
+    """
+    Consume a token stream until the first top-level JSON object closes.
+    Returns just that object's text, or everything read if no object
+    completed. Braces inside JSON strings are ignored. The stream is not
+    read further once the object is complete, so trailing prose is never
+    generated into the buffer.
+    """
+    parts: list[str] = []
+    offset = 0
+    start = -1
+    depth = 0
+    in_string = False
+    escaped = False
+
+    async for token in tokens:
+        parts.append(token)
+        for i, ch in enumerate(token):
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                if depth:
+                    in_string = True
+            elif ch == "{":
+                if depth == 0:
+                    start = offset + i
+                depth += 1
+            elif ch == "}" and depth:
+                depth -= 1
+                if depth == 0:
+                    return "".join(parts)[start:offset + i + 1]
+        offset += len(token)
+
+    return "".join(parts)
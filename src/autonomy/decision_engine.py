@@ -4,16 +4,223 @@ Central hub for autonomous decision-making.
 Determines: act autonomously vs. ask human, local vs. external, priority ordering.
 """
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
-from typing import Optional
+import re
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
 
 from ..brain.llm_client import LLMClient
 from ..brain.personality import PersonalityEngine
+from ._json_utils import parse_llm_json
 
 logger = logging.getLogger(__name__)
 
+# Prompt templates, filled with str.format (literal braces are doubled)
+_EVALUATION_RULES = """Rules:
+- action "execute" = proceed autonomously
+- action "ask_human" = only for truly ambiguous or personal decisions
+- action "refuse" = only for clearly harmful/unethical requests
+- requires_external = true only if this needs a larger LLM model"""
+
+_EVALUATE_PROMPT = """You are an autonomous AI agent making a decision.
+
+Request: "{request}"
+{context_line}
+
+Your autonomy level: {autonomy_level}
+
+Evaluate this request and decide how to handle it.
+Respond with ONLY valid JSON:
+{{
+    "action": "execute",
+    "risk_level": "{risk}",
+    "requires_external": false,
+    "reasoning": "brief reasoning",
+    "suggested_approach": "what to do",
+    "task_type": "shell|file|web|api|think",
+    "estimated_steps": 1
+}}
+
+""" + _EVALUATION_RULES
+
+_EVALUATE_BATCH_PROMPT = """You are an autonomous AI agent making decisions for several independent requests.
+
+{listing}
+
+Your autonomy level: {autonomy_level}
+
+Evaluate each request and decide how to handle it.
+Respond with ONLY a valid JSON array containing exactly {count} objects, one per request, in order:
+[
+    {{
+        "index": 0,
+        "action": "execute",
+        "risk_level": "safe|moderate|dangerous",
+        "requires_external": false,
+        "reasoning": "brief reasoning",
+        "suggested_approach": "what to do",
+        "task_type": "shell|file|web|api|think",
+        "estimated_steps": 1
+    }}
+]
+
+""" + _EVALUATION_RULES
+
+_PROACTIVE_PROMPT = """You observed something on the system:
+"{observation}"
+
+Should you take proactive action? If yes, what should you do?
+Respond with JSON:
+{{
+    "should_act": true,
+    "action": "what to do",
+    "urgency": "immediate|soon|when_convenient",
+    "reasoning": "why"
+}}"""
+
+_COMPLEXITY_PROMPT = """Classify the complexity of this request:
+"{message}"
+
+Level 1 = Simple (chat, basic Q&A) → local LLM
+Level 2 = Medium (needs memory/context) → local LLM + RAG
+Level 3 = Complex (deep reasoning, code, math) → external API
+
+Respond with JSON only: {{"level": 1, "confidence": 0.9, "needs_rag": false, "reasoning": "brief"}}"""
+
+# Read-only requests that can be executed without asking the LLM
+_SAFE_RE = re.compile(r"^\s*(list|show|cat|ls|echo|pwd|date|whoami|help|status)\b", re.IGNORECASE)
+# Shell metacharacters that can redirect, chain or substitute commands; a
+# request containing any of them is never treated as read-only
+_SHELL_META_RE = re.compile(r"[;&|<>`$\\\n]")
+_ROUTER_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.7"))
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_COMPLEXITY_CACHE_SIZE = 512
+_SIMPLE_KEYWORDS = ("halo", "hi", "hello", "hola", "pagi", "siang", "sore", "malam", "test", "ping", "siapa", "kamu")
+# Phrases that settle the route without the classifier, in one scan: asking
+# about past conversations needs memory, asking for live information goes out
+_KEYWORD_ROUTE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<memory>remember|recall|last time|earlier we|you said|ingat|kemarin|sebelumnya)"
+    r"|(?P<external>search the web|browse the web|latest news|berita terbaru|cari di internet)"
+    r")\b",
+    re.IGNORECASE,
+)
+_KEYWORD_ROUTES = {
+    "memory": {"level": 2, "confidence": 1.0, "needs_rag": True, "reasoning": "Keyword fast path (memory)"},
+    "external": {"level": 3, "confidence": 1.0, "needs_rag": False, "reasoning": "Keyword fast path (live information)"},
+}
+
+
+def _is_read_only(request: str) -> bool:
+    """A plain read-only command: no redirection, chaining or substitution."""
+    return bool(_SAFE_RE.match(request)) and not _SHELL_META_RE.search(request)
+
+
+class _SimilarClassifications:
+    """
+    Complexity classifications keyed by message embedding: a message within
+    cosine `threshold` of a classified one reuses its result. Entries live
+    in a fixed ring of L2-normalized rows, so lookup is one matrix-vector
+    product and the oldest entry is evicted first.
+    """
+
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._results: list[Optional[dict]] = [None] * capacity
+        self._embs: Optional[np.ndarray] = None  # (capacity, dim)
+        self._size = 0
+        self._next = 0
+
+    @staticmethod
+    def normalize(embedding) -> Optional[np.ndarray]:
+        q = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        return q / norm if q.ndim == 1 and norm > 0 else None
+
+    def get(self, q: np.ndarray) -> Optional[dict]:
+        if self._size == 0 or self._embs.shape[1] != q.shape[0]:
+            return None
+        sims = self._embs[: self._size] @ q
+        best = int(np.argmax(sims))
+        return dict(self._results[best]) if sims[best] >= self.threshold else None
+
+    def put(self, q: np.ndarray, result: dict):
+        if self.capacity <= 0:
+            return
+        if self._embs is None or self._embs.shape[1] != q.shape[0]:
+            self._embs = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+            self._size = self._next = 0
+        self._results[self._next] = dict(result)
+        self._embs[self._next] = q
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+
+class _AsyncBatcher:
+    """
+    Coalesces calls arriving within a short window into a single batch.
+    Each caller awaits its own future; the handler receives the whole batch
+    and must return one result per item, in order.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list], Awaitable[list]],
+        window: float = 0.02,
+        max_size: int = 16,
+    ):
+        self._handler = handler
+        self._window = window
+        self._max_size = max_size
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Strong references to running batches, so none is garbage-collected
+        # mid-flight and leaves its callers waiting forever
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self._max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self._window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[object, asyncio.Future]]):
+        try:
+            results = await self._handler([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
 
 class DecisionEngine:
     """
@@ -30,6 +237,19 @@ class DecisionEngine:
     ):
         self.llm = llm_client
         self.personality = personality
+        self._batcher = _AsyncBatcher(
+            self._decide_batch,
+            window=int(os.getenv("DECISION_BATCH_WINDOW_MS", "20")) / 1000,
+            max_size=int(os.getenv("DECISION_BATCH_MAX_SIZE", "16")),
+        )
+        # LRU of LLM complexity classifications, keyed by normalized message
+        self._complexity_cache: OrderedDict[bytes, dict] = OrderedDict()
+        # The same classifications keyed by message embedding, for callers
+        # that pass one: near-identical messages skip the LLM call too
+        self._similar_complexity = _SimilarClassifications(
+            capacity=int(os.getenv("ROUTER_CLASSIFICATION_CACHE_SIZE", "512")),
+            threshold=float(os.getenv("ROUTER_CLASSIFICATION_CACHE_SIMILARITY", "0.95")),
+        )
 
     async def evaluate(self, request: str, context: str = "") -> dict:
         """
@@ -47,69 +267,133 @@ class DecisionEngine:
         risk = self.personality.get_risk_level(request)
 
         # If the request contains dangerous commands, check confirmation
-        if self.personality.requires_confirmation(request):
-            return {
-                "action": "ask_human",
-                "risk_level": "dangerous",
-                "requires_external": False,
-                "reasoning": "This action requires human confirmation per safety config.",
-                "suggested_approach": request,
-            }
-
-        # For safe and moderate actions, use LLM to decide the approach
-        prompt = f"""You are an autonomous AI agent making a decision.
-
-Request: "{request}"
-{f'Context: {context}' if context else ''}
+        confirmation = self._confirmation_decision(request)
+        if confirmation:
+            return confirmation
 
-Your autonomy level: {self.personality.autonomy.get('level', 'full')}
+        # Short read-only requests don't need the LLM to decide
+        if risk == "safe" and not context and _is_read_only(request):
+            return self._default_decision(request, risk, "Safe read-only request")
 
-Evaluate this request and decide how to handle it.
-Respond with ONLY valid JSON:
-{{
-    "action": "execute",
-    "risk_level": "{risk}",
-    "requires_external": false,
-    "reasoning": "brief reasoning",
-    "suggested_approach": "what to do",
-    "task_type": "shell|file|web|api|think",
-    "estimated_steps": 1
-}}
+        # For safe and moderate actions, use LLM to decide the approach.
+        # Concurrent evaluations are coalesced into a single LLM call.
+        return await self._batcher.submit((request, context, risk))
 
-Rules:
-- action "execute" = proceed autonomously
-- action "ask_human" = only for truly ambiguous or personal decisions
-- action "refuse" = only for clearly harmful/unethical requests
-- requires_external = true only if this needs a larger LLM model"""
+    async def evaluate_many(self, requests: list[str]) -> list[dict]:
+        """
+        Evaluate several requests with a single LLM round trip.
+        Returns one decision per request, in the same order.
+        """
+        decisions: list[Optional[dict]] = [None] * len(requests)
+        pending = []
+        for i, request in enumerate(requests):
+            confirmation = self._confirmation_decision(request)
+            if confirmation:
+                decisions[i] = confirmation
+                continue
+            risk = self.personality.get_risk_level(request)
+            if risk == "safe" and _is_read_only(request):
+                decisions[i] = self._default_decision(request, risk, "Safe read-only request")
+            else:
+                pending.append((i, (request, "", risk)))
+
+        if pending:
+            results = await self._decide_batch([item for _, item in pending])
+            for (i, _), decision in zip(pending, results):
+                decisions[i] = decision
+
+        return decisions
+
+    def _confirmation_decision(self, request: str) -> Optional[dict]:
+        """Return an ask_human decision if the request needs confirmation."""
+        if not self.personality.requires_confirmation(request):
+            return None
+        return {
+            "action": "ask_human",
+            "risk_level": "dangerous",
+            "requires_external": False,
+            "reasoning": "This action requires human confirmation per safety config.",
+            "suggested_approach": request,
+        }
+
+    async def _decide_batch(self, items: list[tuple[str, str, str]]) -> list[dict]:
+        """Decide a batch of (request, context, risk) items with one LLM call."""
+        if len(items) == 1:
+            request, context, risk = items[0]
+            return [await self._decide_single(request, context, risk)]
+
+        autonomy_level = self.personality.autonomy.get("level", "full")
+        listing = "\n".join(
+            f'{i}. Request: "{request}"' + (f"\n   Context: {context}" if context else "")
+            for i, (request, context, _) in enumerate(items)
+        )
+        prompt = _EVALUATE_BATCH_PROMPT.format(
+            listing=listing, autonomy_level=autonomy_level, count=len(items)
+        )
 
         response = await self.llm.generate(prompt, temperature=0.2)
 
+        parsed: list = []
         try:
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
+            parsed = parse_llm_json(response)
+            if not isinstance(parsed, list):
+                parsed = []
+        except json.JSONDecodeError:
+            logger.warning(f"Failed to parse batched decisions: {response[:200]}")
+
+        # Place decisions by their declared index, falling back to position
+        by_index: dict[int, dict] = {}
+        for position, decision in enumerate(parsed):
+            if isinstance(decision, dict):
+                index = decision.pop("index", position)
+                by_index.setdefault(index if isinstance(index, int) else position, decision)
+
+        decisions = []
+        for i, (request, _, risk) in enumerate(items):
+            decision = by_index.get(i)
+            if decision is None:
+                decisions.append(self._default_decision(request, risk))
+            else:
+                decision.setdefault("risk_level", risk)
+                decisions.append(self._apply_overrides(decision, risk))
+        return decisions
+
+    async def _decide_single(self, request: str, context: str, risk: str) -> dict:
+        """Decide a single request with its own LLM call."""
+        prompt = _EVALUATE_PROMPT.format(
+            request=request,
+            context_line=f"Context: {context}" if context else "",
+            autonomy_level=self.personality.autonomy.get("level", "full"),
+            risk=risk,
+        )
+
+        response = await self.llm.generate(prompt, temperature=0.2, response_format="json")
 
-            decision = json.loads(json_str)
-
-            # Override with personality constraints
-            if risk == "dangerous" and not self.personality.is_autonomous():
-                decision["action"] = "ask_human"
-                decision["reasoning"] += " (overridden: autonomy not fully enabled)"
-
-            return decision
+        try:
+            decision = parse_llm_json(response)
+            return self._apply_overrides(decision, risk)
 
-        except (json.JSONDecodeError, IndexError):
+        except json.JSONDecodeError:
             # Default to execute if LLM response is unparseable
-            return {
-                "action": "execute",
-                "risk_level": risk,
-                "requires_external": False,
-                "reasoning": "Default decision: proceed with execution",
-                "suggested_approach": request,
-            }
+            return self._default_decision(request, risk)
+
+    def _apply_overrides(self, decision: dict, risk: str) -> dict:
+        """Override an LLM decision with personality constraints."""
+        if risk == "dangerous" and not self.personality.is_autonomous():
+            decision["action"] = "ask_human"
+            decision["reasoning"] = decision.get("reasoning", "") + " (overridden: autonomy not fully enabled)"
+        return decision
+
+    def _default_decision(
+        self, request: str, risk: str, reasoning: str = "Default decision: proceed with execution"
+    ) -> dict:
+        return {
+            "action": "execute",
+            "risk_level": risk,
+            "requires_external": False,
+            "reasoning": reasoning,
+            "suggested_approach": request,
+        }
 
     async def should_proactively_act(self, observation: str) -> Optional[dict]:
         """
@@ -119,77 +403,87 @@ Rules:
         if not self.personality.is_autonomous():
             return None
 
-        prompt = f"""You observed something on the system:
-"{observation}"
-
-Should you take proactive action? If yes, what should you do?
-Respond with JSON:
-{{
-    "should_act": true,
-    "action": "what to do",
-    "urgency": "immediate|soon|when_convenient",
-    "reasoning": "why"
-}}"""
+        prompt = _PROACTIVE_PROMPT.format(observation=observation)
 
-        response = await self.llm.generate(prompt, temperature=0.3)
+        response = await self.llm.generate(prompt, temperature=0.3, response_format="json")
 
         try:
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
-
-            decision = json.loads(json_str)
+            decision = parse_llm_json(response)
             if decision.get("should_act", False):
                 return decision
             return None
-        except (json.JSONDecodeError, IndexError):
+        except json.JSONDecodeError:
             return None
 
-    async def classify_complexity(self, message: str) -> dict:
+    @staticmethod
+    def _complexity_key(message: str) -> bytes:
+        return hashlib.blake2b(
+            _WHITESPACE_RE.sub(" ", message.strip().lower()).encode(), digest_size=16
+        ).digest()
+
+    def quick_classify(self, message: str) -> Optional[dict]:
         """
-        Classify the complexity of a user message for smart routing.
-        Returns: {"level": 1|2|3, "confidence": 0.0-1.0, "needs_rag": bool}
+        The complexity classification if it needs no LLM call (heuristic fast
+        path or a cached result for the same message), else None.
         """
+        # Keyword fast path: memory / live-information requests
+        match = _KEYWORD_ROUTE_RE.search(message)
+        if match is not None:
+            result = _KEYWORD_ROUTES[match.lastgroup]
+            logger.info(f"⚡ Keyword path (router): '{message[:20]}...' -> Level {result['level']}")
+            return dict(result)
+
         # Heuristic Fast Path for complexity
         msg_len = len(message.strip())
-        simple_keywords = ["halo", "hi", "hello", "hola", "pagi", "siang", "sore", "malam", "test", "ping", "siapa", "kamu"]
-        is_simple = any(k in message.lower() for k in simple_keywords) and msg_len < 60
+        is_simple = msg_len < 60 and any(k in message.lower() for k in _SIMPLE_KEYWORDS)
 
         if msg_len < 10 or is_simple:
             logger.info(f"⚡ Fast path (router): '{message[:20]}...' -> Level 1")
             return {"level": 1, "confidence": 1.0, "needs_rag": False, "reasoning": "Heuristic fast path"}
 
-        prompt = f"""Classify the complexity of this request:
-"{message}"
+        key = self._complexity_key(message)
+        cached = self._complexity_cache.get(key)
+        if cached is not None:
+            self._complexity_cache.move_to_end(key)
+            return dict(cached)
+        return None
 
-Level 1 = Simple (chat, basic Q&A) → local LLM
-Level 2 = Medium (needs memory/context) → local LLM + RAG
-Level 3 = Complex (deep reasoning, code, math) → external API
-
-Respond with JSON only: {{"level": 1, "confidence": 0.9, "needs_rag": false, "reasoning": "brief"}}"""
+    async def classify_complexity(self, message: str, embedding=None) -> dict:
+        """
+        Classify the complexity of a user message for smart routing.
+        Returns: {"level": 1|2|3, "confidence": 0.0-1.0, "needs_rag": bool}
+        With the message's embedding, a previously classified message that is
+        close enough in meaning answers without an LLM call.
+        """
+        result = self.quick_classify(message)
+        if result is not None:
+            return result
 
-        response = await self.llm.generate(prompt, temperature=0.1)
+        q = _SimilarClassifications.normalize(embedding) if embedding is not None else None
+        if q is not None:
+            similar = self._similar_complexity.get(q)
+            if similar is not None:
+                logger.info(f"⚡ Similar message cache (router): '{message[:20]}...' -> Level {similar.get('level', 1)}")
+                return similar
 
-        try:
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
+        key = self._complexity_key(message)
+        prompt = _COMPLEXITY_PROMPT.format(message=message)
 
-            result = json.loads(json_str)
-            threshold = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.7"))
+        response = await self.llm.generate(prompt, temperature=0.1, response_format="json")
 
+        try:
+            result = parse_llm_json(response)
             # If confidence is below threshold, bump up to external
-            if result.get("confidence", 1.0) < threshold and result.get("level", 1) < 3:
+            if result.get("confidence", 1.0) < _ROUTER_THRESHOLD and result.get("level", 1) < 3:
                 result["level"] = 3
                 result["reasoning"] = f"Low confidence ({result.get('confidence')}), escalating to external API"
 
+            self._complexity_cache[key] = dict(result)
+            if len(self._complexity_cache) > _COMPLEXITY_CACHE_SIZE:
+                self._complexity_cache.popitem(last=False)
+            if q is not None:
+                self._similar_complexity.put(q, result)
             return result
 
-        except (json.JSONDecodeError, IndexError):
+        except json.JSONDecodeError:
             return {"level": 1, "confidence": 0.5, "needs_rag": False, "reasoning": "parse error, defaulting to local"}
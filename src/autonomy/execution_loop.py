@@ -5,19 +5,102 @@ Executes tasks autonomously: Think → Act → Observe → Decide.
 """
 
 import asyncio
+import contextlib
 import json
 import logging
 import os
-import subprocess
 from typing import Optional
 
+import httpx
+
 from ..brain.llm_client import LLMClient
 from ..brain.personality import PersonalityEngine
 from ..brain.system_prompt import SystemPromptBuilder
+from ._json_utils import parse_llm_json
 from .goal_planner import GoalPlanner, Task, TaskStatus
 
 logger = logging.getLogger(__name__)
 
+_SHELL_TIMEOUT = int(os.getenv("SHELL_TIMEOUT", "300"))
+# File reads are truncated to this many bytes; results are persisted in the task queue
+_MAX_FILE_READ_BYTES = int(os.getenv("MAX_FILE_READ_BYTES", "1048576"))
+# Web task responses are truncated to this many characters
+_MAX_WEB_CHARS = 20000
+_SEARCH_URL = "https://lite.duckduckgo.com/lite/"
+
+# Prompt templates, filled with str.format (literal braces are doubled)
+_SHELL_PROMPT = "Generate the exact shell command (bash) to: {action}\nRespond with ONLY the command, nothing else."
+
+_FILE_PROMPT = """Analyze this file operation task and provide the exact action to take.
+Task: {action}
+Command hint: {command}
+
+Respond with JSON: {{"operation": "read|write|create|delete", "path": "/path/to/file", "content": "if write/create"}}"""
+
+_WEB_PROMPT = "Extract the URL or search query from this task: {action}\nRespond with ONLY the URL or 'search: query'"
+
+_API_PROMPT = "Handle this API task: {action}\nDetails: {command}"
+
+_API_BATCH_PROMPT = """Handle each of the following independent tasks.
+
+{listing}
+
+Respond with ONLY a valid JSON array of exactly {count} strings, where item i is the full response to task i."""
+
+
+async def _run_shell(command: str, timeout: float, cwd: Optional[str] = None) -> tuple[int, str, str]:
+    """
+    Run a shell command without blocking the event loop.
+    Returns (returncode, stdout, stderr); kills the process and raises
+    asyncio.TimeoutError if it runs longer than timeout seconds.
+    """
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise
+    return (
+        proc.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace"),
+    )
+
+
+def _do_file_op(operation: str, path: str, content: str) -> str:
+    """Perform a blocking file operation; run via asyncio.to_thread."""
+    if operation == "read":
+        with open(path, "rb") as f:
+            data = f.read(_MAX_FILE_READ_BYTES + 1)
+        text = data[:_MAX_FILE_READ_BYTES].decode("utf-8", "replace")
+        if len(data) > _MAX_FILE_READ_BYTES:
+            text += f"\n... (truncated at {_MAX_FILE_READ_BYTES} bytes)"
+        return text
+    elif operation in ("write", "create"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = content.encode("utf-8")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        return f"File written: {path}"
+    elif operation == "delete":
+        os.remove(path)
+        return f"File deleted: {path}"
+    else:
+        return f"Unknown file operation: {operation}"
+
 
 class ExecutionLoop:
     """
@@ -37,7 +120,17 @@ class ExecutionLoop:
         self.prompt_builder = prompt_builder
         self.planner = goal_planner
         self.running = False
+        self.batch_size = int(os.getenv("AUTONOMY_BATCH_SIZE", "4"))
+        self.workers = max(1, int(os.getenv("AUTONOMY_WORKERS", "4")))
         self._reflection_callback = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # Shared client for web tasks: pooled, keep-alive connections
+        self._http = httpx.AsyncClient(
+            http2=True,
+            timeout=30,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
 
     def set_reflection_callback(self, callback):
         """Set callback for self-reflection on failures."""
@@ -46,41 +139,120 @@ class ExecutionLoop:
     async def start(self):
         """Start the autonomous execution loop."""
         self.running = True
-        logger.info("🚀 Autonomous execution loop started.")
+        self._flush_task = asyncio.create_task(self.planner.flush_loop())
+        logger.info(f"🚀 Autonomous execution loop started ({self.workers} workers).")
 
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def _worker(self):
+        """
+        Claim and execute batches until the loop stops.
+        Claiming is synchronous (no await between get_next_task and
+        mark_in_progress), so workers never pick up the same task.
+        """
         while self.running:
-            task = self.planner.get_next_task()
+            batch = self._claim_batch()
 
-            if task is None:
+            if not batch:
                 # No tasks to process, sleep and check again
                 await asyncio.sleep(5)
                 continue
 
-            logger.info(f"📋 Executing task [{task.id}]: {task.action}")
-            task.status = TaskStatus.IN_PROGRESS
+            try:
+                await self._execute_claimed(batch)
+            except Exception as e:
+                # Never let one batch end the worker
+                logger.error(f"Worker error while executing a batch: {e}")
+                await asyncio.sleep(5)
+            finally:
+                # Tasks left unfinished by an error or cancellation run again later
+                for task in batch:
+                    self.planner.release(task.id)
+
+    async def _execute_claimed(self, batch: list[Task]):
+        """Execute a claimed batch, recording each task's result or failure."""
+        logger.info(f"📋 Executing batch of {len(batch)}: {', '.join(t.id for t in batch)}")
+        batched_results = await self._execute_batched(batch)
 
+        for task in batch:
             try:
-                result = await self._execute_task(task)
+                if task.id in batched_results:
+                    result = batched_results[task.id]
+                else:
+                    logger.info(f"📋 Executing task [{task.id}]: {task.action}")
+                    result = await self._execute_task(task)
                 self.planner.mark_completed(task.id, result)
                 logger.info(f"✅ Task [{task.id}] completed: {result[:100]}")
             except Exception as e:
-                error_msg = str(e)
-                logger.warning(f"❌ Task [{task.id}] failed: {error_msg}")
-
-                # Record the attempt
-                self.planner.mark_failed(task.id, error_msg, f"Attempt with approach: {task.command or task.action}")
-
-                # Trigger self-reflection if callback is set
-                if self._reflection_callback and task.status == TaskStatus.PENDING:
-                    logger.info(f"🔄 Triggering self-reflection for task [{task.id}]...")
-                    await self._reflection_callback(task, error_msg)
+                # The failure and any retry tasks from reflection share one write
+                with self.planner.batch():
+                    await self._handle_failure(task, e)
+
+    def _claim_batch(self) -> list[Task]:
+        """
+        Claim up to batch_size executable tasks.
+        Claimed tasks are marked IN_PROGRESS, so a task depending on another
+        task in the same batch is never returned — the batch is independent.
+        """
+        batch = []
+        while len(batch) < self.batch_size:
+            task = self.planner.get_next_task()
+            if task is None:
+                break
+            self.planner.mark_in_progress(task.id)
+            batch.append(task)
+        return batch
+
+    async def _execute_batched(self, batch: list[Task]) -> dict[str, str]:
+        """
+        Execute the batchable tasks of a claimed batch with a single LLM call.
+        Returns results keyed by task id; tasks missing from the result are
+        executed individually.
+        """
+        api_tasks = [t for t in batch if t.task_type == "api"]
+        if len(api_tasks) < 2:
+            return {}
 
-            # Small delay between tasks to prevent CPU spinning
-            await asyncio.sleep(1)
+        try:
+            outputs = await self._execute_api_batch(api_tasks)
+        except Exception as e:
+            # Unparseable output or an LLM outage: each task then runs (and
+            # fails, if need be) on its own
+            logger.warning(f"Batched API execution failed, running tasks individually: {e}")
+            return {}
+
+        return {task.id: output for task, output in zip(api_tasks, outputs)}
+
+    async def _handle_failure(self, task: Task, error: Exception):
+        """Record a failed attempt and trigger self-reflection."""
+        error_msg = str(error)
+        logger.warning(f"❌ Task [{task.id}] failed: {error_msg}")
+
+        # Record the attempt
+        self.planner.mark_failed(task.id, error_msg, f"Attempt with approach: {task.command or task.action}")
+
+        # Trigger self-reflection if callback is set
+        if self._reflection_callback and task.status == TaskStatus.PENDING:
+            logger.info(f"🔄 Triggering self-reflection for task [{task.id}]...")
+            try:
+                await self._reflection_callback(task, error_msg)
+            except Exception as e:
+                logger.warning(f"Self-reflection for task [{task.id}] failed: {e}")
 
     async def stop(self):
         """Stop the execution loop gracefully."""
         self.running = False
+        if self._flush_task:
+            self._flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flush_task
+            self._flush_task = None
+        await self._http.aclose()
         logger.info("⏹️ Autonomous execution loop stopped.")
 
     async def execute_single(self, task: Task) -> str:
@@ -105,7 +277,7 @@ class ExecutionLoop:
         command = task.command
         if not command:
             # Ask the LLM to generate the command
-            prompt = f"Generate the exact shell command (bash) to: {task.action}\nRespond with ONLY the command, nothing else."
+            prompt = _SHELL_PROMPT.format(action=task.action)
             command = await self.llm.generate(prompt, temperature=0.1)
             command = command.strip().strip("`").strip()
 
@@ -124,92 +296,85 @@ class ExecutionLoop:
         logger.info(f"🖥️ Executing shell: {command}")
 
         try:
-            result = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=int(os.getenv("SHELL_TIMEOUT", "300")),
-                cwd=os.getcwd(),
-            )
-
-            output = result.stdout.strip()
-            if result.returncode != 0:
-                error = result.stderr.strip()
-                raise RuntimeError(f"Command failed (exit {result.returncode}): {error}")
+            returncode, stdout, stderr = await _run_shell(command, _SHELL_TIMEOUT, cwd=os.getcwd())
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Command timed out after {_SHELL_TIMEOUT}s: {command}")
 
-            return output or "(command completed successfully with no output)"
+        output = stdout.strip()
+        if returncode != 0:
+            error = stderr.strip()
+            raise RuntimeError(f"Command failed (exit {returncode}): {error}")
 
-        except subprocess.TimeoutExpired:
-            raise TimeoutError(f"Command timed out after {os.getenv('SHELL_TIMEOUT', '300')}s: {command}")
+        return output or "(command completed successfully with no output)"
 
     async def _execute_file(self, task: Task) -> str:
         """Execute a file operation (read, write, create, delete)."""
-        prompt = f"""Analyze this file operation task and provide the exact action to take.
-Task: {task.action}
-Command hint: {task.command}
+        prompt = _FILE_PROMPT.format(action=task.action, command=task.command)
 
-Respond with JSON: {{"operation": "read|write|create|delete", "path": "/path/to/file", "content": "if write/create"}}"""
-
-        response = await self.llm.generate(prompt, temperature=0.1)
+        response = await self.llm.generate(prompt, temperature=0.1, response_format="json")
 
         try:
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
-
-            action = json.loads(json_str)
+            action = parse_llm_json(response)
             operation = action.get("operation", "read")
             path = action.get("path", "")
             content = action.get("content", "")
 
-            if operation == "read":
-                with open(path, "r") as f:
-                    return f.read()
-            elif operation in ("write", "create"):
-                os.makedirs(os.path.dirname(path), exist_ok=True)
-                with open(path, "w") as f:
-                    f.write(content)
-                return f"File written: {path}"
-            elif operation == "delete":
-                if self.personality.requires_confirmation(f"rm {path}"):
-                    raise PermissionError(f"Delete requires confirmation: {path}")
-                os.remove(path)
-                return f"File deleted: {path}"
-            else:
-                return f"Unknown file operation: {operation}"
+            if operation == "delete" and self.personality.requires_confirmation(f"rm {path}"):
+                raise PermissionError(f"Delete requires confirmation: {path}")
+            return await asyncio.to_thread(_do_file_op, operation, path, content)
         except json.JSONDecodeError:
             raise ValueError(f"Could not parse file operation from LLM response: {response[:200]}")
 
     async def _execute_web(self, task: Task) -> str:
         """Execute a web request or browser action."""
-        # For now, use shell-based curl. Could be enhanced with browser automation.
+        # Plain HTTP fetch. Could be enhanced with browser automation.
         url = task.command or ""
         if not url:
-            prompt = f"Extract the URL or search query from this task: {task.action}\nRespond with ONLY the URL or 'search: query'"
+            prompt = _WEB_PROMPT.format(action=task.action)
             url = await self.llm.generate(prompt, temperature=0.1)
             url = url.strip()
 
-        if url.startswith("search:"):
-            query = url[7:].strip()
-            command = f'curl -s "https://lite.duckduckgo.com/lite/?q={query}" | head -100'
-        else:
-            command = f'curl -sL "{url}" | head -200'
-
-        result = subprocess.run(
-            command, shell=True, capture_output=True, text=True, timeout=30
-        )
-        return result.stdout.strip() or "(no web content returned)"
+        try:
+            if url.startswith("search:"):
+                response = await self._http.get(_SEARCH_URL, params={"q": url[7:].strip()})
+            else:
+                if "://" not in url:
+                    # Bare host/path (curl used to accept these too)
+                    url = f"https://{url}"
+                response = await self._http.get(url)
+        except httpx.TimeoutException:
+            raise TimeoutError(f"Web request timed out after 30s: {url}")
+        if response.is_error:
+            raise RuntimeError(
+                f"Web request failed (HTTP {response.status_code}): {url}"
+            )
+        return response.text[:_MAX_WEB_CHARS].strip() or "(no web content returned)"
 
     async def _execute_api(self, task: Task) -> str:
         """Execute an API call (routed through the smart router)."""
         # This will be handled by the smart router for external API calls
-        prompt = f"Handle this API task: {task.action}\nDetails: {task.command}"
+        prompt = _API_PROMPT.format(action=task.action, command=task.command)
         return await self.llm.generate(prompt, temperature=0.3)
 
+    async def _execute_api_batch(self, tasks: list[Task]) -> list[str]:
+        """Execute several independent API tasks with one LLM call."""
+        listing = "\n".join(
+            f"{i}. Handle this API task: {task.action}\n   Details: {task.command}"
+            for i, task in enumerate(tasks)
+        )
+        prompt = _API_BATCH_PROMPT.format(listing=listing, count=len(tasks))
+
+        response = await self.llm.generate(prompt, temperature=0.3)
+
+        try:
+            outputs = parse_llm_json(response)
+        except json.JSONDecodeError:
+            raise ValueError(f"Could not parse batched response: {response[:200]}")
+
+        if not isinstance(outputs, list) or len(outputs) != len(tasks):
+            raise ValueError(f"Expected {len(tasks)} results, got: {response[:200]}")
+        return [o if isinstance(o, str) else json.dumps(o) for o in outputs]
+
     async def _execute_think(self, task: Task) -> str:
         """Use the LLM to think/reason about something."""
         system = self.prompt_builder.build()
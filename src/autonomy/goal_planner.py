@@ -4,20 +4,32 @@ Decomposes high-level goals into executable steps using chain-of-thought reasoni
 Maintains a persistent task queue that survives restarts.
 """
 
-import json
+import asyncio
+import contextlib
 import logging
 import os
+import time
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
 from ..brain.llm_client import LLMClient
 from ..brain.system_prompt import SystemPromptBuilder
+from ._json_utils import parse_llm_json
 
 logger = logging.getLogger(__name__)
 
+# Compact the journal once it holds this many times more lines than live tasks
+_COMPACT_RATIO = 4
+_COMPACT_MIN_LINES = 64
+
+_MAX_RETRIES = int(os.getenv("AUTONOMY_MAX_RETRIES", "3"))
+
 
 class TaskPriority(str, Enum):
     CRITICAL = "critical"
@@ -35,33 +47,54 @@ class TaskStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+# Scheduling order, most urgent first
+_PRIORITY_ORDER = (
+    TaskPriority.CRITICAL,
+    TaskPriority.HIGH,
+    TaskPriority.NORMAL,
+    TaskPriority.BACKGROUND,
+)
+
+
+def _new_task_id() -> str:
+    return str(uuid.uuid4())[:8]
+
+
+def _iso_to_ns(value: Optional[str]) -> int:
+    """Convert a stored ISO timestamp back to epoch nanoseconds."""
+    if not value:
+        return time.time_ns()
+    return round(datetime.fromisoformat(value).timestamp() * 1_000_000) * 1000
+
+
+@dataclass(slots=True, eq=False)
 class Task:
     """Represents a single executable task in the queue."""
 
-    def __init__(
-        self,
-        goal: str,
-        action: str = "",
-        task_type: str = "think",
-        command: str = "",
-        priority: TaskPriority = TaskPriority.NORMAL,
-        parent_id: Optional[str] = None,
-        depends_on: Optional[list[str]] = None,
-    ):
-        self.id = str(uuid.uuid4())[:8]
-        self.goal = goal
-        self.action = action
-        self.task_type = task_type  # shell, file, web, api, think
-        self.command = command
-        self.priority = priority
-        self.status = TaskStatus.PENDING
-        self.parent_id = parent_id
-        self.depends_on = depends_on or []
-        self.result: Optional[str] = None
-        self.error: Optional[str] = None
-        self.attempts: list[str] = []
-        self.created_at = datetime.now().isoformat()
-        self.completed_at: Optional[str] = None
+    goal: str
+    action: str = ""
+    task_type: str = "think"  # shell, file, web, api, think
+    command: str = ""
+    priority: TaskPriority = TaskPriority.NORMAL
+    parent_id: Optional[str] = None
+    depends_on: list[str] = field(default_factory=list)
+    id: str = field(default_factory=_new_task_id, init=False)
+    status: TaskStatus = field(default=TaskStatus.PENDING, init=False)
+    result: Optional[str] = field(default=None, init=False)
+    error: Optional[str] = field(default=None, init=False)
+    attempts: list[str] = field(default_factory=list, init=False)
+    # Creation time as epoch nanoseconds; formatted only when displayed or saved
+    created_at_ns: int = field(default_factory=time.time_ns, init=False)
+    completed_at: Optional[str] = field(default=None, init=False)
+
+    def __post_init__(self):
+        # Callers historically pass depends_on=None for "no dependencies"
+        if self.depends_on is None:
+            self.depends_on = []
+
+    @property
+    def created_at(self) -> str:
+        return datetime.fromtimestamp(self.created_at_ns / 1e9).isoformat()
 
     def to_dict(self) -> dict:
         return {
@@ -78,6 +111,7 @@ class Task:
             "error": self.error,
             "attempts": self.attempts,
             "created_at": self.created_at,
+            "created_at_ns": self.created_at_ns,
             "completed_at": self.completed_at,
         }
 
@@ -90,14 +124,14 @@ class Task:
             command=data.get("command", ""),
             priority=TaskPriority(data.get("priority", "normal")),
             parent_id=data.get("parent_id"),
-            depends_on=data.get("depends_on", []),
+            depends_on=data.get("depends_on") or [],
         )
         task.id = data["id"]
         task.status = TaskStatus(data.get("status", "pending"))
         task.result = data.get("result")
         task.error = data.get("error")
         task.attempts = data.get("attempts", [])
-        task.created_at = data.get("created_at", datetime.now().isoformat())
+        task.created_at_ns = data.get("created_at_ns") or _iso_to_ns(data.get("created_at"))
         task.completed_at = data.get("completed_at")
         return task
 
@@ -114,31 +148,192 @@ class GoalPlanner:
         self.llm = llm_client
         self.prompt_builder = prompt_builder
         self.queue_path = Path(
-            queue_path or os.getenv("AUTONOMY_TASK_QUEUE_PATH", "./data/task_queue.json")
+            queue_path or os.getenv("AUTONOMY_TASK_QUEUE_PATH", "./data/task_queue.jsonl")
         )
         self.tasks: list[Task] = []
+        # Indexes over self.tasks, kept in sync on every insert/status change
+        self._by_id: dict[str, Task] = {}
+        self._pending_by_priority: dict[TaskPriority, dict[str, Task]] = {
+            p: {} for p in _PRIORITY_ORDER
+        }
+        self._completed_ids: set[str] = set()
+        # Append-only journal: pending bytes and number of lines on disk
+        self._journal_buf = bytearray()
+        self._journal_lines = 0
+        self._flush_loop_active = False
+        self._batch_depth = 0
         self._load_queue()
 
     def _load_queue(self):
-        """Load persistent task queue from disk."""
-        if self.queue_path.exists():
-            try:
-                with open(self.queue_path, "r") as f:
-                    data = json.load(f)
-                self.tasks = [Task.from_dict(t) for t in data]
-                pending = sum(1 for t in self.tasks if t.status == TaskStatus.PENDING)
-                logger.info(f"Loaded task queue: {len(self.tasks)} total, {pending} pending")
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.warning(f"Failed to load task queue: {e}")
-                self.tasks = []
-        else:
-            self.tasks = []
+        """
+        Load persistent task queue from disk by replaying the journal.
+        A legacy JSON array snapshot is also accepted and rewritten as a journal,
+        including the old task_queue.json next to a journal not yet created.
+        """
+        self.tasks = []
+        source = self.queue_path
+        if not source.exists():
+            legacy_path = source.with_suffix(".json")
+            if source.suffix != ".jsonl" or not legacy_path.exists():
+                self._rebuild_index()
+                return
+            logger.info(f"Migrating legacy task queue {legacy_path} → {source}")
+            source = legacy_path
+
+        try:
+            with open(source, "rb") as f:
+                text = f.read()
+        except OSError as e:
+            logger.warning(f"Failed to load task queue: {e}")
+            self._rebuild_index()
+            return
+
+        legacy = text.lstrip().startswith(b"[")
+        corrupt = False
+        tasks: dict[str, Task] = {}
+        try:
+            if legacy:
+                for data in orjson.loads(text):
+                    task = Task.from_dict(data)
+                    tasks[task.id] = task
+            else:
+                for line in text.splitlines():
+                    if not line.strip():
+                        continue
+                    self._journal_lines += 1
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        # A torn final write after a crash; skip it
+                        logger.warning(f"Skipping corrupt task journal line: {line[:100]!r}")
+                        corrupt = True
+                        continue
+                    if entry.get("op") == "upsert":
+                        task = Task.from_dict(entry["task"])
+                        tasks[task.id] = task
+        except (orjson.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Failed to load task queue: {e}")
+            tasks = {}
+
+        self.tasks = list(tasks.values())
+        # Claims don't outlive the process; tasks that were running are retried
+        for task in self.tasks:
+            if task.status == TaskStatus.IN_PROGRESS:
+                task.status = TaskStatus.PENDING
+        self._rebuild_index()
+        pending = self.get_pending_count()
+        logger.info(f"Loaded task queue: {len(self.tasks)} total, {pending} pending")
+
+        if legacy or corrupt:
+            self.compact()
+
+    def _rebuild_index(self):
+        """Rebuild the id and status indexes from self.tasks."""
+        self._by_id = {t.id: t for t in self.tasks}
+        for bucket in self._pending_by_priority.values():
+            bucket.clear()
+        self._completed_ids.clear()
+        for task in self.tasks:
+            self._index_status(task)
+
+    def _index_status(self, task: Task):
+        if task.status == TaskStatus.PENDING:
+            self._pending_by_priority[task.priority][task.id] = task
+        elif task.status == TaskStatus.COMPLETED:
+            self._completed_ids.add(task.id)
+
+    def _insert(self, task: Task):
+        self.tasks.append(task)
+        self._by_id[task.id] = task
+        self._index_status(task)
+
+    def _set_status(self, task: Task, status: TaskStatus):
+        """Change a task's status, moving it between indexes."""
+        if task.status == TaskStatus.PENDING:
+            self._pending_by_priority[task.priority].pop(task.id, None)
+        elif task.status == TaskStatus.COMPLETED:
+            self._completed_ids.discard(task.id)
+        task.status = status
+        self._index_status(task)
+
+    def _record(self, task: Task):
+        """Append a task's current state to the journal buffer."""
+        self._journal_buf += orjson.dumps(
+            {"op": "upsert", "task": task.to_dict()}, option=orjson.OPT_APPEND_NEWLINE
+        )
+        self._journal_lines += 1
 
     def _save_queue(self):
-        """Persist task queue to disk."""
+        """Persist buffered journal entries, unless the flush loop or an open batch will."""
+        if not self._flush_loop_active and self._batch_depth == 0:
+            self.flush()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Defer disk writes until the outermost batch exits, so a sequence of
+        mutations (e.g. a failure plus the tasks added by reflection) is
+        written once.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._save_queue()
+
+    def flush(self):
+        """Write buffered journal entries to disk."""
+        if not self._journal_buf:
+            return
+
+        self.queue_path.parent.mkdir(parents=True, exist_ok=True)
+        data = bytes(self._journal_buf)
+        self._journal_buf.clear()
+        fd = os.open(self.queue_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+        finally:
+            os.close(fd)
+
+        if self._journal_lines > max(_COMPACT_MIN_LINES, _COMPACT_RATIO * len(self.tasks)):
+            self.compact()
+
+    def compact(self):
+        """Rewrite the journal as a snapshot with one line per live task."""
+        self._journal_buf.clear()
         self.queue_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.queue_path, "w") as f:
-            json.dump([t.to_dict() for t in self.tasks], f, indent=2)
+        tmp_path = self.queue_path.with_suffix(self.queue_path.suffix + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(
+                orjson.dumps({"op": "upsert", "task": self._snapshot(task)}, option=orjson.OPT_APPEND_NEWLINE)
+                for task in self.tasks
+            ))
+        os.replace(tmp_path, self.queue_path)
+        self._journal_lines = len(self.tasks)
+
+    @staticmethod
+    def _snapshot(task: Task) -> dict:
+        """A task as written by compact(); claimed tasks are saved as pending."""
+        data = task.to_dict()
+        if task.status == TaskStatus.IN_PROGRESS:
+            data["status"] = TaskStatus.PENDING.value
+        return data
+
+    async def flush_loop(self, interval: float = 0.5):
+        """Flush the journal periodically instead of on every mutation."""
+        self._flush_loop_active = True
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                self.flush()
+        finally:
+            self._flush_loop_active = False
+            self.flush()
 
     async def plan(
         self,
@@ -152,44 +347,50 @@ class GoalPlanner:
         prompt = self.prompt_builder.build_goal_planning_prompt(goal, context)
         system = self.prompt_builder.build()
 
-        response = await self.llm.generate(prompt, system=system, temperature=0.3)
+        response = await self.llm.generate(
+            prompt, system=system, temperature=0.3, response_format="json"
+        )
 
         try:
-            # Extract JSON from response (handle markdown code blocks)
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
-
-            plan = json.loads(json_str)
+            plan = parse_llm_json(response)
             steps = plan.get("steps", [])
-        except (json.JSONDecodeError, IndexError):
+        except orjson.JSONDecodeError:
             logger.warning(f"Failed to parse goal plan, creating single task: {response[:200]}")
             steps = [{"id": 1, "action": goal, "type": "think", "command": "", "depends_on": []}]
 
-        # Create Task objects
+        # Steps identical to a queued or running task reuse that task instead
+        # of being added again (common when a failing goal is replanned)
+        active = {
+            (t.goal, t.action, t.task_type, t.command): t.id
+            for t in self.tasks
+            if t.status in (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)
+        }
+        duplicates = [
+            active.get((goal, step.get("action", ""), step.get("type", "think"), step.get("command", "")))
+            for step in steps
+        ]
+
+        # Assign task ids up front so dependencies resolve in a single pass
+        task_ids = [existing or _new_task_id() for existing in duplicates]
+        id_mapping = {step.get("id", i + 1): task_ids[i] for i, step in enumerate(steps)}
+
         new_tasks = []
-        id_mapping = {}
-        for step in steps:
+        for task_id, step, existing in zip(task_ids, steps, duplicates):
+            if existing:
+                logger.debug(f"Skipping duplicate step, reusing task [{existing}]: {step.get('action', '')}")
+                continue
             task = Task(
                 goal=goal,
                 action=step.get("action", ""),
                 task_type=step.get("type", "think"),
                 command=step.get("command", ""),
                 priority=priority,
-                depends_on=[],
+                depends_on=[id_mapping[d] for d in step.get("depends_on", []) if d in id_mapping],
             )
-            id_mapping[step.get("id", len(id_mapping) + 1)] = task.id
+            task.id = task_id
+            self._insert(task)
+            self._record(task)
             new_tasks.append(task)
-
-        # Resolve dependencies
-        for i, step in enumerate(steps):
-            deps = step.get("depends_on", [])
-            new_tasks[i].depends_on = [id_mapping[d] for d in deps if d in id_mapping]
-
-        self.tasks.extend(new_tasks)
         self._save_queue()
 
         logger.info(f"Created {len(new_tasks)} tasks for goal: {goal}")
@@ -197,61 +398,58 @@ class GoalPlanner:
 
     def add_task(self, task: Task):
         """Manually add a task to the queue."""
-        self.tasks.append(task)
+        self._insert(task)
+        self._record(task)
         self._save_queue()
 
     def get_next_task(self) -> Optional[Task]:
         """Get the next executable task based on priority and dependencies."""
-        # Priority order
-        priority_order = [
-            TaskPriority.CRITICAL,
-            TaskPriority.HIGH,
-            TaskPriority.NORMAL,
-            TaskPriority.BACKGROUND,
-        ]
-
-        for priority in priority_order:
-            for task in self.tasks:
-                if task.status != TaskStatus.PENDING:
-                    continue
-                if task.priority != priority:
-                    continue
+        # Buckets are visited most-urgent first, so the first runnable task wins
+        for priority in _PRIORITY_ORDER:
+            for task in self._pending_by_priority[priority].values():
                 # Check if all dependencies are completed
-                deps_met = all(
-                    any(t.id == dep and t.status == TaskStatus.COMPLETED for t in self.tasks)
-                    for dep in task.depends_on
-                )
-                if deps_met:
+                if all(dep in self._completed_ids for dep in task.depends_on):
                     return task
 
         return None
 
+    def mark_in_progress(self, task_id: str):
+        """Mark a task as claimed for execution."""
+        task = self._by_id.get(task_id)
+        if task:
+            self._set_status(task, TaskStatus.IN_PROGRESS)
+
+    def release(self, task_id: str):
+        """Return a claimed task that was not finished to the pending queue."""
+        task = self._by_id.get(task_id)
+        if task and task.status == TaskStatus.IN_PROGRESS:
+            self._set_status(task, TaskStatus.PENDING)
+
     def mark_completed(self, task_id: str, result: str = ""):
         """Mark a task as completed."""
-        for task in self.tasks:
-            if task.id == task_id:
-                task.status = TaskStatus.COMPLETED
-                task.result = result
-                task.completed_at = datetime.now().isoformat()
-                break
+        task = self._by_id.get(task_id)
+        if task:
+            self._set_status(task, TaskStatus.COMPLETED)
+            task.result = result
+            task.completed_at = datetime.now().isoformat()
+            self._record(task)
         self._save_queue()
 
     def mark_failed(self, task_id: str, error: str, attempt: str = ""):
         """Mark a task as failed."""
-        for task in self.tasks:
-            if task.id == task_id:
-                task.error = error
-                task.attempts.append(attempt or error)
-                max_retries = int(os.getenv("AUTONOMY_MAX_RETRIES", "3"))
-                if len(task.attempts) >= max_retries:
-                    task.status = TaskStatus.FAILED
-                else:
-                    task.status = TaskStatus.PENDING  # Will be retried
-                break
+        task = self._by_id.get(task_id)
+        if task:
+            task.error = error
+            task.attempts.append(attempt or error)
+            if len(task.attempts) >= _MAX_RETRIES:
+                self._set_status(task, TaskStatus.FAILED)
+            else:
+                self._set_status(task, TaskStatus.PENDING)  # Will be retried
+            self._record(task)
         self._save_queue()
 
     def get_pending_count(self) -> int:
-        return sum(1 for t in self.tasks if t.status == TaskStatus.PENDING)
+        return sum(len(bucket) for bucket in self._pending_by_priority.values())
 
     def get_queue_summary(self) -> dict:
         """Get a summary of the task queue."""
@@ -266,4 +464,5 @@ class GoalPlanner:
     def clear_completed(self):
         """Remove completed tasks from the queue."""
         self.tasks = [t for t in self.tasks if t.status != TaskStatus.COMPLETED]
-        self._save_queue()
+        self._rebuild_index()
+        self.compact()
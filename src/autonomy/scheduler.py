@@ -5,13 +5,15 @@ Handles cron-like scheduling and dynamic task creation.
 """
 
 import asyncio
-import json
+import functools
 import logging
 import os
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Callable, Optional
 
+import orjson
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
@@ -21,6 +23,44 @@ from .goal_planner import GoalPlanner, Task, TaskPriority
 
 logger = logging.getLogger(__name__)
 
+# Saves requested within this many seconds are written to disk once
+_SAVE_DELAY = 0.5
+
+# Applied to every job: never overlap a run with itself, and collapse runs
+# missed while the agent was busy or down into a single catch-up run
+_JOB_DEFAULTS = {
+    "max_instances": 1,
+    "coalesce": True,
+    "misfire_grace_time": 300,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class SchedulerConfig:
+    """Scheduler settings, read from the environment once."""
+
+    jobs_path: str = "./data/scheduled_jobs.json"
+    health_check_hours: int = 24
+    memory_consolidation_hours: int = 168
+    evolution_hours: int = 168
+    evolution_min_samples: int = 200
+
+    @classmethod
+    def from_env(cls) -> "SchedulerConfig":
+        return cls(
+            jobs_path=os.getenv("SCHEDULER_JOBS_PATH", "./data/scheduled_jobs.json"),
+            health_check_hours=int(os.getenv("SCHEDULER_HEALTH_CHECK_INTERVAL_HOURS", "24")),
+            memory_consolidation_hours=int(os.getenv("SCHEDULER_MEMORY_CONSOLIDATION_HOURS", "168")),
+            evolution_hours=int(os.getenv("EVOLUTION_SCHEDULE_HOURS", "168")),
+            evolution_min_samples=int(os.getenv("EVOLUTION_MIN_SAMPLES", "200")),
+        )
+
+
+@functools.lru_cache(maxsize=512)
+def _parse_cron(schedule: str) -> CronTrigger:
+    """Parse a crontab expression once; triggers are read-only and safe to share between jobs."""
+    return CronTrigger.from_crontab(schedule)
+
 
 class ProactiveScheduler:
     """
@@ -32,14 +72,21 @@ class ProactiveScheduler:
         self,
         goal_planner: GoalPlanner,
         personality: PersonalityEngine,
+        config: Optional[SchedulerConfig] = None,
+        interaction_count: Optional[Callable[[], int]] = None,
     ):
         self.planner = goal_planner
         self.personality = personality
-        self.scheduler = AsyncIOScheduler()
+        self.cfg = config or SchedulerConfig.from_env()
+        # Number of collected interactions (InteractionCollector.get_count),
+        # across rotated log segments
+        self.interaction_count = interaction_count
+        self.scheduler = AsyncIOScheduler(job_defaults=_JOB_DEFAULTS)
         self.custom_jobs: list[dict] = []
-        self._schedule_file = Path(
-            os.getenv("SCHEDULER_JOBS_PATH", "./data/scheduled_jobs.json")
-        )
+        self._schedule_file = Path(self.cfg.jobs_path)
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_lock = asyncio.Lock()
 
     def start(self):
         """Start the scheduler with default proactive behaviors."""
@@ -47,7 +94,7 @@ class ProactiveScheduler:
 
         # Daily system health check
         if behaviors.get("daily_health_check", True):
-            interval = int(os.getenv("SCHEDULER_HEALTH_CHECK_INTERVAL_HOURS", "24"))
+            interval = self.cfg.health_check_hours
             self.scheduler.add_job(
                 self._health_check,
                 IntervalTrigger(hours=interval),
@@ -59,7 +106,7 @@ class ProactiveScheduler:
 
         # Memory consolidation
         if behaviors.get("auto_memory_consolidation", True):
-            interval = int(os.getenv("SCHEDULER_MEMORY_CONSOLIDATION_HOURS", "168"))
+            interval = self.cfg.memory_consolidation_hours
             self.scheduler.add_job(
                 self._memory_consolidation,
                 IntervalTrigger(hours=interval),
@@ -71,7 +118,7 @@ class ProactiveScheduler:
 
         # Auto-evolution trigger
         if behaviors.get("auto_evolution_trigger", True):
-            evolution_hours = int(os.getenv("EVOLUTION_SCHEDULE_HOURS", "168"))
+            evolution_hours = self.cfg.evolution_hours
             self.scheduler.add_job(
                 self._check_evolution_ready,
                 IntervalTrigger(hours=evolution_hours),
@@ -92,7 +139,9 @@ class ProactiveScheduler:
             )
             logger.info("📅 Scheduled: Disk space monitor every 6h")
 
-        # Load custom jobs from disk
+        # Load custom jobs from disk. This must run before scheduler.start():
+        # jobs added while stopped are queued and committed to the job store
+        # in a single pass (one lock, one wakeup) when the scheduler starts.
         self._load_custom_jobs()
 
         self.scheduler.start()
@@ -100,6 +149,10 @@ class ProactiveScheduler:
 
     def stop(self):
         """Stop the scheduler."""
+        if self._save_handle is not None:
+            # Write out any save still waiting on the debounce timer
+            self._save_handle.cancel()
+            self._flush_custom_jobs()
         self.scheduler.shutdown(wait=False)
         logger.info("⏹️ Proactive scheduler stopped.")
 
@@ -118,7 +171,7 @@ class ProactiveScheduler:
 
         self.scheduler.add_job(
             self._execute_scheduled_goal,
-            CronTrigger.from_crontab(schedule),
+            _parse_cron(schedule),
             id=job_id,
             name=name,
             replace_existing=True,
@@ -133,8 +186,11 @@ class ProactiveScheduler:
             "priority": priority.value,
             "created_at": datetime.now().isoformat(),
         }
+        # replace_existing swapped the scheduled job; replace its record too,
+        # otherwise every re-registration adds another entry to restore at boot
+        self.custom_jobs = [j for j in self.custom_jobs if j["id"] != job_id]
         self.custom_jobs.append(job_entry)
-        self._save_custom_jobs()
+        self._schedule_save()
 
         logger.info(f"📅 Dynamic job added: {name} ({schedule})")
 
@@ -143,7 +199,7 @@ class ProactiveScheduler:
         try:
             self.scheduler.remove_job(job_id)
             self.custom_jobs = [j for j in self.custom_jobs if j["id"] != job_id]
-            self._save_custom_jobs()
+            self._schedule_save()
             logger.info(f"🗑️ Dynamic job removed: {job_id}")
         except Exception as e:
             logger.warning(f"Failed to remove job {job_id}: {e}")
@@ -176,12 +232,18 @@ class ProactiveScheduler:
     async def _check_evolution_ready(self):
         """Check if enough training data has been collected for evolution."""
         logger.info("🧬 Checking if evolution cycle should be triggered...")
-        min_samples = int(os.getenv("EVOLUTION_MIN_SAMPLES", "200"))
+        if self.interaction_count is None:
+            logger.warning("No interaction counter configured; skipping evolution check.")
+            return
+        min_samples = self.cfg.evolution_min_samples
+        count = self.interaction_count()
+        if count < min_samples:
+            logger.info(f"🧬 {count}/{min_samples} interactions collected; not ready to evolve.")
+            return
         task = Task(
-            goal="Check evolution readiness",
-            action=f"Check if there are at least {min_samples} quality interactions for LoRA training. If yes, trigger evolution cycle.",
-            task_type="shell",
-            command=f"wc -l data/training/interactions.jsonl 2>/dev/null || echo '0 lines'",
+            goal="Evolution cycle",
+            action=f"{count} interactions have been collected (at least {min_samples} needed). Trigger the evolution cycle: build the training dataset and run LoRA training.",
+            task_type="think",
             priority=TaskPriority.BACKGROUND,
         )
         self.planner.add_task(task)
@@ -204,30 +266,73 @@ class ProactiveScheduler:
 
     # --- Persistence ---
 
+    def _schedule_save(self):
+        """
+        Request a save of custom jobs. Requests arriving before the pending
+        save runs are coalesced, so a burst of job changes is one write.
+        """
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(
+                _SAVE_DELAY, self._start_save
+            )
+
+    def _start_save(self):
+        self._save_handle = None
+        self._save_task = asyncio.ensure_future(self._save_custom_jobs_async())
+
+    async def _save_custom_jobs_async(self):
+        """Save custom jobs with the file I/O off the event loop thread."""
+        # Snapshot on the loop so the worker thread never sees a list mid-update
+        data = orjson.dumps(self.custom_jobs, option=orjson.OPT_INDENT_2)
+        async with self._save_lock:
+            try:
+                await asyncio.to_thread(self._write_custom_jobs, data)
+            except OSError as e:
+                logger.warning(f"Failed to save custom jobs: {e}")
+
+    def _flush_custom_jobs(self):
+        """Synchronously write out a save still waiting on the debounce timer."""
+        self._save_handle = None
+        try:
+            self._save_custom_jobs()
+        except OSError as e:
+            logger.warning(f"Failed to save custom jobs: {e}")
+
     def _save_custom_jobs(self):
-        """Save custom jobs to disk."""
+        """Save custom jobs to disk atomically (write a temp file, then rename)."""
+        self._write_custom_jobs(orjson.dumps(self.custom_jobs, option=orjson.OPT_INDENT_2))
+
+    def _write_custom_jobs(self, data: bytes):
         self._schedule_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(self._schedule_file, "w") as f:
-            json.dump(self.custom_jobs, f, indent=2)
+        tmp_path = self._schedule_file.with_suffix(self._schedule_file.suffix + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, self._schedule_file)
 
     def _load_custom_jobs(self):
         """Load and restore custom jobs from disk."""
         if self._schedule_file.exists():
             try:
-                with open(self._schedule_file, "r") as f:
-                    self.custom_jobs = json.load(f)
-                for job in self.custom_jobs:
+                self.custom_jobs = orjson.loads(self._schedule_file.read_bytes())
+            except Exception as e:
+                logger.warning(f"Failed to load custom jobs: {e}")
+                return
+
+            restored = 0
+            for job in self.custom_jobs:
+                # One bad entry must not prevent the rest from being restored
+                try:
                     self.scheduler.add_job(
                         self._execute_scheduled_goal,
-                        CronTrigger.from_crontab(job["schedule"]),
+                        _parse_cron(job["schedule"]),
                         id=job["id"],
                         name=job["name"],
                         replace_existing=True,
                         args=[job["goal"], TaskPriority(job["priority"])],
                     )
-                logger.info(f"Restored {len(self.custom_jobs)} custom scheduled jobs.")
-            except Exception as e:
-                logger.warning(f"Failed to load custom jobs: {e}")
+                    restored += 1
+                except Exception as e:
+                    logger.warning(f"Failed to restore custom job {job.get('id')}: {e}")
+            logger.info(f"Restored {restored} custom scheduled jobs.")
 
     def get_all_jobs(self) -> list[dict]:
         """List all scheduled jobs."""
@@ -4,12 +4,18 @@ When a task fails, SOVRA analyzes why and adapts its strategy.
 Stores lessons learned in RAG memory to avoid repeating mistakes.
 """
 
+import asyncio
+import contextlib
+import itertools
 import json
 import logging
+import os
+from collections import deque
 from typing import Optional
 
 from ..brain.llm_client import LLMClient
 from ..brain.system_prompt import SystemPromptBuilder
+from ._json_utils import collect_json_object, parse_llm_json
 from .goal_planner import GoalPlanner, Task, TaskPriority
 
 logger = logging.getLogger(__name__)
@@ -32,7 +38,14 @@ class SelfReflection:
         self.prompt_builder = prompt_builder
         self.planner = goal_planner
         self.memory = memory_store  # RAG memory for storing lessons
-        self.reflection_history: list[dict] = []
+        # Bounded: only recent reflections are kept, totals are counted separately
+        self.reflection_history: deque[dict] = deque(
+            maxlen=int(os.getenv("SOVRA_REFLECTION_HISTORY", "1000"))
+        )
+        self._total_reflections = 0
+        self._escalation_count = 0
+        # Strong references to in-flight lesson writes so they aren't collected
+        self._background: set[asyncio.Task] = set()
 
     async def reflect(self, task: Task, error: str) -> dict:
         """
@@ -47,18 +60,18 @@ class SelfReflection:
             attempts=task.attempts,
         )
 
-        response = await self.llm.generate(prompt, temperature=0.3)
+        # Stream the response and stop reading as soon as the JSON object closes
+        async with contextlib.aclosing(
+            self.llm.generate_stream(prompt, temperature=0.3)
+        ) as tokens:
+            response = await collect_json_object(tokens)
 
         try:
-            json_str = response.strip()
-            if "```" in json_str:
-                json_str = json_str.split("```")[1]
-                if json_str.startswith("json"):
-                    json_str = json_str[4:]
-                json_str = json_str.strip()
-
-            reflection = json.loads(json_str)
-        except (json.JSONDecodeError, IndexError):
+            reflection = parse_llm_json(response)
+        except json.JSONDecodeError:
+            reflection = None
+
+        if not isinstance(reflection, dict):
             reflection = {
                 "root_cause": "Unable to determine root cause",
                 "new_strategy": response.strip()[:500],
@@ -77,6 +90,8 @@ class SelfReflection:
             "should_escalate": reflection.get("should_escalate", False),
         }
         self.reflection_history.append(reflection_entry)
+        self._total_reflections += 1
+        self._escalation_count += bool(reflection_entry["should_escalate"])
 
         logger.info(f"🔍 Root cause: {reflection.get('root_cause', 'unknown')}")
         logger.info(f"💡 New strategy: {reflection.get('new_strategy', 'none')}")
@@ -100,14 +115,39 @@ class SelfReflection:
                 f"it failed because: {reflection.get('root_cause', 'unknown')}. "
                 f"Better approach: {reflection.get('new_strategy', 'try differently')}."
             )
-            try:
-                await self.memory.store(lesson, metadata={"type": "lesson", "task": task.action})
-                logger.info("📝 Lesson stored in memory for future reference.")
-            except Exception as e:
-                logger.warning(f"Failed to store lesson in memory: {e}")
+            # The caller doesn't need the write to finish; store in the background
+            store = asyncio.create_task(
+                self.memory.store(lesson, metadata={"type": "lesson", "task": task.action})
+            )
+            self._background.add(store)
+            store.add_done_callback(self._on_lesson_stored)
 
         return reflection
 
+    def _on_lesson_stored(self, store: asyncio.Task):
+        self._background.discard(store)
+        if store.cancelled():
+            return
+        error = store.exception()
+        if error:
+            logger.warning(f"Failed to store lesson in memory: {error}")
+        else:
+            logger.info("📝 Lesson stored in memory for future reference.")
+
+    async def reflect_many(self, failures: list[tuple[Task, str]]) -> list[dict]:
+        """
+        Reflect on several (task, error) failures concurrently.
+        Concurrency is capped at OLLAMA_NUM_PARALLEL, the number of requests
+        the local model server processes in parallel.
+        """
+        semaphore = asyncio.Semaphore(int(os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+
+        async def reflect_one(task: Task, error: str) -> dict:
+            async with semaphore:
+                return await self.reflect(task, error)
+
+        return list(await asyncio.gather(*(reflect_one(t, e) for t, e in failures)))
+
     async def recall_similar_failures(self, task_description: str) -> list[str]:
         """Check memory for similar past failures and their solutions."""
         if not self.memory:
@@ -125,10 +165,9 @@ class SelfReflection:
 
     def get_reflection_summary(self) -> dict:
         """Get a summary of all reflections."""
+        history = self.reflection_history
         return {
-            "total_reflections": len(self.reflection_history),
-            "escalations": sum(
-                1 for r in self.reflection_history if r.get("should_escalate", False)
-            ),
-            "recent": self.reflection_history[-5:] if self.reflection_history else [],
+            "total_reflections": self._total_reflections,
+            "escalations": self._escalation_count,
+            "recent": list(itertools.islice(history, max(0, len(history) - 5), None)),
         }
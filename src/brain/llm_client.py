@@ -3,16 +3,58 @@ SOVRA Brain - LLM Client
 Interfaces with Ollama for local LLM inference.
 """
 
+import asyncio
 import httpx
-import json
 import logging
+import orjson
 import os
 from typing import AsyncIterator, Optional
-from dotenv import load_dotenv
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# One pooled HTTP client per (host, timeout), shared by all LLMClient
+# instances and closed when the last one using it is closed.
+_CLIENTS: dict[tuple[str, float], list] = {}
+
+
+def _acquire_client(host: str, timeout: float) -> httpx.AsyncClient:
+    key = (host, timeout)
+    entry = _CLIENTS.get(key)
+    if entry is None or entry[0].is_closed:
+        # A socket path (or unix:// URL) talks to Ollama over a Unix domain
+        # socket, skipping TCP and the loopback stack entirely
+        uds = None
+        base_url = host
+        if host.startswith(("unix://", "/")):
+            uds = host.removeprefix("unix://")
+            base_url = "http://localhost"
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=1,
+            uds=uds,
+            # Keep idle connections around between chat turns and embeddings
+            limits=httpx.Limits(
+                max_connections=64, max_keepalive_connections=32, keepalive_expiry=600.0
+            ),
+        )
+        client = httpx.AsyncClient(base_url=base_url, timeout=timeout, transport=transport)
+        entry = _CLIENTS[key] = [client, 0]
+    entry[1] += 1
+    return entry[0]
+
+
+async def _release_client(host: str, timeout: float):
+    key = (host, timeout)
+    entry = _CLIENTS.get(key)
+    if entry is None:
+        return
+    entry[1] -= 1
+    if entry[1] <= 0:
+        del _CLIENTS[key]
+        await entry[0].aclose()
+
 
 class LLMClient:
     """Client for communicating with Ollama's local LLM API."""
@@ -30,7 +72,12 @@ class LLMClient:
         )
         # Increase timeout for CPU inference (default 10m)
         self._timeout = float(os.getenv("OLLAMA_TIMEOUT", "600"))
-        self._client = httpx.AsyncClient(base_url=self.host, timeout=self._timeout)
+        self._client = _acquire_client(self.host, self._timeout)
+        self._closed = False
+
+    async def _post(self, path: str, payload: dict) -> httpx.Response:
+        """POST a JSON payload, encoded once with orjson instead of httpx's json=."""
+        return await self._client.post(path, content=orjson.dumps(payload), headers=_JSON_HEADERS)
 
     async def generate(
         self,
@@ -38,8 +85,13 @@ class LLMClient:
         system: Optional[str] = None,
         temperature: float = 0.7,
         stream: bool = False,
+        response_format: Optional[str] = None,
     ) -> str:
-        """Generate a completion from the local LLM."""
+        """
+        Generate a completion from the local LLM.
+        response_format="json" constrains sampling to valid JSON (Ollama's
+        JSON mode), so callers can parse the response directly.
+        """
         payload = {
             "model": self.model,
             "prompt": prompt,
@@ -53,9 +105,11 @@ class LLMClient:
         }
         if system:
             payload["system"] = system
+        if response_format == "json":
+            payload["format"] = "json"
 
         try:
-            response = await self._client.post("/api/generate", json=payload)
+            response = await self._post("/api/generate", payload)
             response.raise_for_status()
             data = response.json()
             return data.get("response", "")
@@ -92,7 +146,7 @@ class LLMClient:
         }
 
         try:
-            response = await self._client.post("/api/chat", json=payload)
+            response = await self._post("/api/chat", payload)
             response.raise_for_status()
             data = response.json()
             return data.get("message", {}).get("content", "")
@@ -103,8 +157,67 @@ class LLMClient:
             logger.error(f"LLM chat error: {e.response.status_code}")
             raise
 
+    async def chat_stream(
+        self,
+        messages: list[dict],
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+    ) -> AsyncIterator[str]:
+        """Stream a chat completion's content as it is generated."""
+        chat_messages = []
+        if system:
+            chat_messages.append({"role": "system", "content": system})
+        chat_messages.extend(messages)
+
+        payload = {
+            "model": self.model,
+            "messages": chat_messages,
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+                "num_ctx": self.context_length,
+            },
+        }
+
+        streamed = False
+        try:
+            async with self._client.stream(
+                "POST", "/api/chat", content=orjson.dumps(payload), headers=_JSON_HEADERS
+            ) as response:
+                if response.is_error:
+                    logger.error(f"LLM chat error: {response.status_code}")
+                    response.raise_for_status()
+                buf = b""
+                async for chunk in response.aiter_bytes():
+                    buf += chunk
+                    while (nl := buf.find(b"\n")) != -1:
+                        line, buf = buf[:nl], buf[nl + 1:]
+                        if not line.strip():
+                            continue
+                        data = orjson.loads(line)
+                        token = data.get("message", {}).get("content", "")
+                        if token:
+                            streamed = True
+                            yield token
+                        if data.get("done", False):
+                            return
+                if buf.strip():
+                    token = orjson.loads(buf).get("message", {}).get("content", "")
+                    if token:
+                        streamed = True
+                        yield token
+        except httpx.ReadTimeout:
+            logger.warning(f"LLM chat timed out after {self._timeout}s.")
+            # After partial output the notice would read as part of the reply
+            if streamed:
+                raise
+            yield "⏱️ [Timeout] I took too long to respond."
+
     async def generate_stream(
-        self, prompt: str, system: Optional[str] = None
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: Optional[float] = None,
     ) -> AsyncIterator[str]:
         """Stream tokens from the LLM."""
         payload = {
@@ -115,29 +228,70 @@ class LLMClient:
         }
         if system:
             payload["system"] = system
+        if temperature is not None:
+            payload["options"]["temperature"] = temperature
 
-        async with self._client.stream(
-            "POST", "/api/generate", json=payload
-        ) as response:
-            async for line in response.aiter_lines():
-                if line:
-                    data = json.loads(line)
-                    token = data.get("response", "")
+        try:
+            async with self._client.stream(
+                "POST", "/api/generate", content=orjson.dumps(payload), headers=_JSON_HEADERS
+            ) as response:
+                # Split NDJSON on raw bytes; avoids per-line str decoding
+                buf = b""
+                async for chunk in response.aiter_bytes():
+                    buf += chunk
+                    while (nl := buf.find(b"\n")) != -1:
+                        line, buf = buf[:nl], buf[nl + 1:]
+                        if not line.strip():
+                            continue
+                        data = orjson.loads(line)
+                        token = data.get("response", "")
+                        if token:
+                            yield token
+                        if data.get("done", False):
+                            return
+                if buf.strip():
+                    token = orjson.loads(buf).get("response", "")
                     if token:
                         yield token
-                    if data.get("done", False):
-                        break
+        except httpx.ReadTimeout:
+            logger.warning(f"LLM stream timed out after {self._timeout}s.")
 
     async def embeddings(self, text: str, model: Optional[str] = None) -> list[float]:
         """Generate embeddings using local embedding model."""
         embed_model = model or os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
         payload = {"model": embed_model, "prompt": text}
 
-        response = await self._client.post("/api/embeddings", json=payload)
+        response = await self._post("/api/embeddings", payload)
         response.raise_for_status()
         data = response.json()
         return data.get("embedding", [])
 
+    async def embeddings_batch(
+        self, texts: list[str], model: Optional[str] = None
+    ) -> list[list[float]]:
+        """
+        Generate embeddings for several texts in one request (Ollama /api/embed).
+        Falls back to concurrent single-text requests on servers without it.
+        """
+        if not texts:
+            return []
+        embed_model = model or os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+        payload = {"model": embed_model, "input": texts}
+
+        response = await self._post("/api/embed", payload)
+        if response.status_code != 404:
+            response.raise_for_status()
+            return response.json().get("embeddings", [])
+
+        # Older Ollama without the batch endpoint: bounded parallel fan-out
+        semaphore = asyncio.Semaphore(16)
+
+        async def embed_one(text: str) -> list[float]:
+            async with semaphore:
+                return await self.embeddings(text, model=embed_model)
+
+        return list(await asyncio.gather(*(embed_one(t) for t in texts)))
+
     async def is_available(self) -> bool:
         """Check if Ollama is reachable."""
         try:
@@ -154,8 +308,10 @@ class LLMClient:
         return [m["name"] for m in data.get("models", [])]
 
     async def close(self):
-        """Close the HTTP client."""
-        await self._client.aclose()
+        """Release the shared HTTP client; it is closed with its last user."""
+        if not self._closed:
+            self._closed = True
+            await _release_client(self.host, self._timeout)
 
     async def __aenter__(self):
         return self
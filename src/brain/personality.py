@@ -3,29 +3,112 @@ SOVRA Brain - Personality Engine
 Loads and manages the AI's personality traits from config.
 """
 
-import json
+import copy
+import functools
 import logging
 import os
+import re
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "personality.json"
 
 
+@functools.lru_cache(maxsize=8)
+def _read_config(path: str) -> dict:
+    """Read and parse a personality file once per process; reload() clears this."""
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _compile_patterns(patterns) -> Optional[re.Pattern]:
+    """
+    Compile literal substrings into one alternation, so a text is scanned once
+    for all of them instead of once per pattern. Returns None if empty.
+    """
+    patterns = [p for p in patterns if p]
+    if not patterns:
+        return None
+    return re.compile("|".join(re.escape(p) for p in patterns))
+
+
 class PersonalityEngine:
     """Manages SOVRA's personality traits and autonomy configuration."""
 
+    __slots__ = (
+        "config_path",
+        "config",
+        "version",
+        "_confirmation_cache",
+        "_risk_cache",
+        "_traits",
+        "_autonomy",
+        "_boundaries",
+        "_expertise_areas",
+        "_proactive_behaviors",
+        "_is_autonomous",
+        "_auto_execute",
+        "_confirmation_re",
+        "_dangerous_re",
+        "_moderate_re",
+        "_prompt_vars",
+    )
+
     def __init__(self, config_path: Optional[str] = None):
         self.config_path = Path(config_path) if config_path else DEFAULT_CONFIG_PATH
         self.config = self._load_config()
+        # Bumped on every reload so dependents can invalidate derived caches
+        self.version = 0
+        # Per-instance memoization of the pattern scans below; the same
+        # commands are re-checked on every retry and by several subsystems.
+        self._confirmation_cache = functools.lru_cache(maxsize=1024)(self._scan_confirmation)
+        self._risk_cache = functools.lru_cache(maxsize=1024)(self._scan_risk_level)
+        self._derive()
+
+    def _derive(self):
+        """Precompute the views of self.config used on hot paths."""
+        config = self.config
+        self._traits = config.get("traits", {})
+        self._autonomy = config.get("autonomy", {"level": "full"})
+        self._boundaries = config.get("boundaries", {})
+        self._expertise_areas = config.get("expertise_areas", [])
+        self._proactive_behaviors = config.get("proactive_behaviors", {})
+
+        autonomy = self._autonomy
+        self._is_autonomous = autonomy.get("level", "full") == "full"
+        self._auto_execute = {
+            "shell": autonomy.get("auto_execute_shell", True),
+            "files": autonomy.get("auto_manage_files", True),
+            "packages": autonomy.get("auto_install_packages", True),
+            "web": autonomy.get("auto_browse_web", True),
+            "schedule": autonomy.get("auto_schedule_tasks", True),
+        }
+
+        risk_config = autonomy.get("risk_assessment", {})
+        self._confirmation_re = _compile_patterns(autonomy.get("require_confirmation_for", []))
+        self._dangerous_re = _compile_patterns(a.lower() for a in risk_config.get("dangerous", []))
+        self._moderate_re = _compile_patterns(a.lower() for a in risk_config.get("moderate", []))
+
+        self._prompt_vars = {
+            "name": config.get("name", "Sovra"),
+            "tagline": config.get("tagline", ""),
+            "tone": self._traits.get("tone", ""),
+            "values": ", ".join(self._traits.get("values", [])),
+            "communication_style": self._traits.get("communication_style", ""),
+            "never_share": ", ".join(self._boundaries.get("never_share", [])),
+            "always_disclose": ", ".join(self._boundaries.get("always_disclose", [])),
+            "expertise": ", ".join(self._expertise_areas),
+        }
 
     def _load_config(self) -> dict:
         """Load personality configuration from JSON file."""
         try:
-            with open(self.config_path, "r", encoding="utf-8") as f:
-                config = json.load(f)
+            # Copy: the cached dict is shared by every engine using this path
+            config = copy.deepcopy(_read_config(str(self.config_path)))
             logger.info(f"Loaded personality: {config.get('name', 'Unknown')} v{config.get('version', '?')}")
             return config
         except FileNotFoundError:
@@ -59,74 +142,65 @@ class PersonalityEngine:
 
     @property
     def traits(self) -> dict:
-        return self.config.get("traits", {})
+        return self._traits
 
     @property
     def autonomy(self) -> dict:
-        return self.config.get("autonomy", {"level": "full"})
+        return self._autonomy
 
     @property
     def boundaries(self) -> dict:
-        return self.config.get("boundaries", {})
+        return self._boundaries
 
     @property
     def expertise_areas(self) -> list[str]:
-        return self.config.get("expertise_areas", [])
+        return self._expertise_areas
 
     @property
     def proactive_behaviors(self) -> dict:
-        return self.config.get("proactive_behaviors", {})
+        return self._proactive_behaviors
 
     def is_autonomous(self) -> bool:
         """Check if SOVRA is in full autonomy mode."""
-        return self.autonomy.get("level", "full") == "full"
+        return self._is_autonomous
 
     def can_auto_execute(self, action_type: str) -> bool:
         """Check if a specific action can be auto-executed."""
-        autonomy = self.autonomy
-        mapping = {
-            "shell": autonomy.get("auto_execute_shell", True),
-            "files": autonomy.get("auto_manage_files", True),
-            "packages": autonomy.get("auto_install_packages", True),
-            "web": autonomy.get("auto_browse_web", True),
-            "schedule": autonomy.get("auto_schedule_tasks", True),
-        }
-        return mapping.get(action_type, False)
+        return self._auto_execute.get(action_type, False)
 
     def requires_confirmation(self, command: str) -> bool:
         """Check if a command requires human confirmation."""
-        dangerous_commands = self.autonomy.get("require_confirmation_for", [])
-        return any(dangerous in command for dangerous in dangerous_commands)
+        return self._confirmation_cache(command)
+
+    def _scan_confirmation(self, command: str) -> bool:
+        return self._confirmation_re is not None and self._confirmation_re.search(command) is not None
 
     def get_risk_level(self, action_description: str) -> str:
         """Assess the risk level of an action."""
-        risk_config = self.autonomy.get("risk_assessment", {})
+        return self._risk_cache(action_description)
+
+    def _scan_risk_level(self, action_description: str) -> str:
         action_lower = action_description.lower()
 
-        for action in risk_config.get("dangerous", []):
-            if action.lower() in action_lower:
-                return "dangerous"
+        if self._dangerous_re is not None and self._dangerous_re.search(action_lower):
+            return "dangerous"
 
-        for action in risk_config.get("moderate", []):
-            if action.lower() in action_lower:
-                return "moderate"
+        if self._moderate_re is not None and self._moderate_re.search(action_lower):
+            return "moderate"
 
         return "safe"
 
     def get_system_prompt_vars(self) -> dict:
         """Get variables for system prompt template rendering."""
-        return {
-            "name": self.name,
-            "tagline": self.tagline,
-            "tone": self.traits.get("tone", ""),
-            "values": ", ".join(self.traits.get("values", [])),
-            "communication_style": self.traits.get("communication_style", ""),
-            "never_share": ", ".join(self.boundaries.get("never_share", [])),
-            "always_disclose": ", ".join(self.boundaries.get("always_disclose", [])),
-            "expertise": ", ".join(self.expertise_areas),
-        }
+        # Copy: callers add their own keys before rendering
+        return dict(self._prompt_vars)
 
     def reload(self):
         """Reload personality config from disk (useful after evolution)."""
+        _read_config.cache_clear()
         self.config = self._load_config()
+        self._derive()
+        self.version += 1
+        self._confirmation_cache.cache_clear()
+        self._risk_cache.cache_clear()
         logger.info("Personality config reloaded.")
@@ -4,13 +4,21 @@ Dynamically constructs system prompts by combining personality, context, and RAG
 """
 
 import logging
-from jinja2 import Template
+import os
+import re
+from pathlib import Path
+from jinja2 import DictLoader, Environment, FileSystemBytecodeCache
 from typing import Optional
 
 from .personality import PersonalityEngine
 
 logger = logging.getLogger(__name__)
 
+# Placeholders rendered into the cached skeleton where per-call context goes
+_RAG_MARK = "\x00rag_context\x00"
+_CONV_MARK = "\x00conversation_context\x00"
+_MARK_SPLIT_RE = re.compile(f"({_RAG_MARK}|{_CONV_MARK})")
+
 # Base system prompt template
 BASE_TEMPLATE = """You are {{ name }}, a sovereign and self-evolving AI agent.
 {{ tagline }}
@@ -66,12 +74,47 @@ You have access to your long-term memory via RAG. Use it to:
 Remember: You are Sovra. You are sovereign. You evolve. You decide."""
 
 
+def _make_environment() -> Environment:
+    """
+    Jinja environment holding the prompt templates. Compiled template code is
+    cached on disk, so later process starts skip parsing and code generation.
+    """
+    bytecode_cache = None
+    cache_dir = Path(os.getenv("JINJA_CACHE_DIR", "./data/jinja_cache"))
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {e}")
+    return Environment(
+        loader=DictLoader({"system_prompt": BASE_TEMPLATE}),
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+    )
+
+
+# Compiled on first use, so importing this module touches no files
+_TEMPLATE = None
+
+
+def _get_template():
+    """The system prompt template, compiled once per process."""
+    global _TEMPLATE
+    if _TEMPLATE is None:
+        _TEMPLATE = _make_environment().get_template("system_prompt")
+    return _TEMPLATE
+
+
 class SystemPromptBuilder:
     """Builds context-aware system prompts for the LLM."""
 
     def __init__(self, personality: PersonalityEngine):
         self.personality = personality
-        self.template = Template(BASE_TEMPLATE)
+        self.template = _get_template()
+        # Rendered prompt skeletons keyed by (has_rag, has_conversation),
+        # valid for one personality version
+        self._skeletons: dict[tuple[bool, bool], list[str]] = {}
+        self._skeleton_version: Optional[int] = None
 
     def build(
         self,
@@ -80,21 +123,13 @@ class SystemPromptBuilder:
         custom_instructions: Optional[str] = None,
     ) -> str:
         """Build the full system prompt with all context injected."""
-        vars = self.personality.get_system_prompt_vars()
-
-        # Add confirmation actions list
-        confirmation_list = self.personality.autonomy.get(
-            "require_confirmation_for", []
-        )
-        vars["confirmation_actions"] = ", ".join(confirmation_list) if confirmation_list else "nothing (full autonomy)"
+        if not (rag_context or conversation_context or custom_instructions):
+            # The context-free prompt is the cached skeleton itself
+            return self._skeleton(False, False)[0]
 
-        # Add RAG context
-        vars["rag_context"] = rag_context or ""
-
-        # Add conversation context
-        vars["conversation_context"] = conversation_context or ""
-
-        prompt = self.template.render(**vars)
+        values = {_RAG_MARK: rag_context or "", _CONV_MARK: conversation_context or ""}
+        parts = self._skeleton(bool(rag_context), bool(conversation_context))
+        prompt = "".join([values.get(part, part) for part in parts])
 
         # Append custom instructions if provided
         if custom_instructions:
@@ -102,6 +137,33 @@ class SystemPromptBuilder:
 
         return prompt
 
+    def _skeleton(self, has_rag: bool, has_conversation: bool) -> list[str]:
+        """
+        Render the template once per personality version and context shape.
+        Context sections are left as placeholder parts, filled in by build().
+        """
+        if self._skeleton_version != self.personality.version:
+            self._skeletons.clear()
+            self._skeleton_version = self.personality.version
+
+        key = (has_rag, has_conversation)
+        parts = self._skeletons.get(key)
+        if parts is None:
+            vars = self.personality.get_system_prompt_vars()
+
+            # Add confirmation actions list
+            confirmation_list = self.personality.autonomy.get(
+                "require_confirmation_for", []
+            )
+            vars["confirmation_actions"] = ", ".join(confirmation_list) if confirmation_list else "nothing (full autonomy)"
+
+            vars["rag_context"] = _RAG_MARK if has_rag else ""
+            vars["conversation_context"] = _CONV_MARK if has_conversation else ""
+
+            parts = _MARK_SPLIT_RE.split(self.template.render(**vars))
+            self._skeletons[key] = parts
+        return parts
+
     def build_routing_prompt(self, user_message: str) -> str:
         """Build a prompt for the smart router to classify task complexity."""
         return f"""Analyze the following user request and classify its complexity.
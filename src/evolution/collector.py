@@ -4,15 +4,68 @@ Logs all interactions for future LoRA fine-tuning.
 Scores interactions based on quality signals.
 """
 
-import json
+import asyncio
+import atexit
+import contextlib
+import io
 import logging
 import os
+import threading
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional
+
+import orjson
 
 logger = logging.getLogger(__name__)
 
+# Running stats are checkpointed to the sidecar file every this many events
+_STATS_CHECKPOINT = 50
+
+
+def log_segments(log_path: Path) -> list[Path]:
+    """
+    All segments of an interaction log, oldest first: rotated segments
+    (`<stem>-YYYYMMDD-HHMMSS-ffffff.jsonl[.zst]`) followed by the active file.
+    """
+    segments = sorted(
+        p for p in log_path.parent.glob(f"{log_path.stem}-*{log_path.suffix}*")
+        if p.suffix in (log_path.suffix, ".zst")
+    )
+    # A segment is briefly in both forms while it is compressed in the background
+    names = {p.name for p in segments}
+    segments = [p for p in segments if p.name + ".zst" not in names]
+    if log_path.exists():
+        segments.append(log_path)
+    return segments
+
+
+def open_log_segment(path: Path) -> BinaryIO:
+    """Open a log segment for binary line iteration, decompressing .zst segments."""
+    if path.suffix != ".zst":
+        return open(path, "rb")
+    import zstandard
+
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+
+
+def _compress_segment(rotated: Path):
+    """zstd-compress a rotated segment next to itself, then remove the original."""
+    import zstandard
+
+    compressed = rotated.with_name(rotated.name + ".zst")
+    tmp_path = compressed.with_name(compressed.name + ".tmp")
+    try:
+        with open(rotated, "rb") as src, open(tmp_path, "wb") as dst:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+        os.replace(tmp_path, compressed)
+        rotated.unlink()
+    except OSError as e:
+        # The uncompressed segment is still a valid part of the log
+        logger.warning(f"Failed to compress {rotated.name}: {e}")
+        return
+    logger.info(f"🗄️ Rotated interaction log → {compressed.name}")
+
 
 class InteractionCollector:
     """
@@ -25,14 +78,182 @@ class InteractionCollector:
             log_path or os.getenv("INTERACTION_LOG_PATH", "./data/training/interactions.jsonl")
         )
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
-        self._count = self._get_current_count()
+        # Appends go through one long-lived buffered handle and reach the
+        # file every `_flush_every` records (and on close), not per call
+        self._flush_every = max(1, int(os.getenv("INTERACTION_FLUSH_BATCH", "32")))
+        # The active file is rotated out (and zstd-compressed) past this size
+        self._rotate_bytes = int(os.getenv("INTERACTION_ROTATE_MB", "128")) * 1024 * 1024
+        self._fh = None
+        self._unflushed = 0
+        # Inside an event loop, records are queued and written in batches by a
+        # single writer task, so concurrent handlers never interleave lines
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        # Background compressions of rotated segments (strong references)
+        self._compressions: set[asyncio.Task] = set()
+        atexit.register(self.close)
+        # Quality stats are kept as running counters and persisted next to the
+        # log, so neither startup nor get_quality_stats has to rescan it
+        self._stats_path = self.log_path.with_suffix(".stats.json")
+        self._count = 0
+        self._scored = 0
+        self._total_score = 0.0
+        self._events = 0
+        # timestamp -> current quality score, built on the first feedback update
+        self._scores: Optional[dict[str, Optional[float]]] = None
+        self._load_stats()
+
+    def _handle(self):
+        if self._fh is None or self._fh.closed:
+            self._fh = open(self.log_path, "ab", buffering=1 << 20)
+        return self._fh
+
+    def _append(self, record: dict):
+        """Queue a record for the writer task, or write it directly outside a loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_records([record])
+            return
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._drain())
+        self._queue.put_nowait(record)
+
+    async def _drain(self):
+        """Writer task: take whatever is queued and write it in one call."""
+        while True:
+            records = [await self._queue.get()]
+            records.extend(self._take_pending())
+            try:
+                self._write_records(records)
+            except Exception as e:
+                logger.warning(f"Failed to write {len(records)} interactions: {e}")
+
+    def _take_pending(self) -> list[dict]:
+        records = []
+        while self._queue is not None and not self._queue.empty():
+            records.append(self._queue.get_nowait())
+        return records
+
+    def _write_records(self, records: list[dict]):
+        self._handle().writelines(orjson.dumps(r) + b"\n" for r in records)
+        self._unflushed += len(records)
+        if self._unflushed >= self._flush_every:
+            self._fh.flush()
+            self._unflushed = 0
+            self._rotate_if_needed()
 
-    def _get_current_count(self) -> int:
-        """Count existing interactions."""
-        if self.log_path.exists():
-            with open(self.log_path, "r") as f:
-                return sum(1 for _ in f)
-        return 0
+    def flush(self):
+        """Write queued and buffered interactions to disk."""
+        pending = self._take_pending()
+        if pending:
+            self._write_records(pending)
+        if self._fh is not None and not self._fh.closed:
+            self._fh.flush()
+            self._unflushed = 0
+
+    def close(self):
+        """Flush and close the log file; it is reopened on the next write."""
+        self.flush()
+        if self._writer is not None and not self._writer.done():
+            # The loop may already be gone when called at interpreter exit
+            with contextlib.suppress(RuntimeError):
+                self._writer.cancel()
+        self._writer = None
+        if self._fh is not None and not self._fh.closed:
+            self._fh.close()
+            self._save_stats()
+        self._fh = None
+
+    def _rotate_if_needed(self):
+        """Move the active file aside once it is large, compressing it if zstandard is available."""
+        if self._fh is None or self._fh.tell() < self._rotate_bytes:
+            return
+        self._fh.close()
+        self._fh = None
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        rotated = self.log_path.with_name(f"{self.log_path.stem}-{stamp}{self.log_path.suffix}")
+        os.replace(self.log_path, rotated)
+        # The active file is now empty; keep the sidecar valid for it
+        self._save_stats()
+
+        try:
+            import zstandard
+        except ImportError:
+            logger.info(f"🗄️ Rotated interaction log → {rotated.name}")
+            return
+
+        # Compressing a whole segment takes a while; keep it off the event loop
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            threading.Thread(target=_compress_segment, args=(rotated,), name="log-compress").start()
+            return
+        task = loop.create_task(asyncio.to_thread(_compress_segment, rotated))
+        self._compressions.add(task)
+        task.add_done_callback(self._compressions.discard)
+
+    def _load_stats(self):
+        """Restore counters from the sidecar, or rebuild them with one scan."""
+        if not log_segments(self.log_path):
+            return
+        size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        try:
+            stats = orjson.loads(self._stats_path.read_bytes())
+            # Only trust the sidecar if the log hasn't changed since it was written
+            if stats.get("size") == size:
+                self._count = stats["total"]
+                self._scored = stats["scored"]
+                self._total_score = stats["total_score"]
+                return
+        except (OSError, orjson.JSONDecodeError, KeyError):
+            pass
+
+        self._count, self._scores = self._scan()
+        scores = [s for s in self._scores.values() if s is not None]
+        self._scored = len(scores)
+        self._total_score = float(sum(scores))
+        self._save_stats()
+
+    def _scan(self) -> tuple[int, dict[str, Optional[float]]]:
+        """
+        Read the log once, folding correction records into the entries they
+        amend. Returns the interaction count and each interaction's score.
+        """
+        count = 0
+        scores: dict[str, Optional[float]] = {}
+        self.flush()
+        for segment in log_segments(self.log_path):
+            with open_log_segment(segment) as f:
+                for line in f:
+                    entry = orjson.loads(line)
+                    target = entry.get("correction_for")
+                    if target is None:
+                        count += 1
+                        scores[entry.get("timestamp")] = entry.get("quality_score")
+                    elif target in scores:
+                        scores[target] = entry.get("quality_score")
+        return count, scores
+
+    def _save_stats(self):
+        """Checkpoint the counters together with the log size they describe."""
+        self.flush()
+        try:
+            self._stats_path.write_bytes(orjson.dumps({
+                "size": self.log_path.stat().st_size if self.log_path.exists() else 0,
+                "total": self._count,
+                "scored": self._scored,
+                "total_score": self._total_score,
+            }))
+        except OSError as e:
+            logger.warning(f"Failed to save interaction stats: {e}")
+
+    def _record_event(self):
+        self._events += 1
+        if self._events % _STATS_CHECKPOINT == 0:
+            self._save_stats()
 
     def log_interaction(
         self,
@@ -44,7 +265,7 @@ class InteractionCollector:
         user_feedback: Optional[str] = None,
         metadata: Optional[dict] = None,
     ):
-        """Log a single interaction."""
+        """Log a single interaction. Never blocks: inside a loop the write is queued."""
         entry = {
             "timestamp": datetime.now().isoformat(),
             "user_input": user_input,
@@ -56,29 +277,44 @@ class InteractionCollector:
             "metadata": metadata or {},
         }
 
-        with open(self.log_path, "a") as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._append(entry)
 
         self._count += 1
+        if self._scores is not None:
+            self._scores[entry["timestamp"]] = quality_score
+        if quality_score is not None:
+            self._scored += 1
+            self._total_score += quality_score
+        self._record_event()
         if self._count % 50 == 0:
             logger.info(f"📊 {self._count} interactions collected for evolution.")
 
     def update_feedback(self, timestamp: str, feedback: str, score: float):
-        """Update feedback for a specific interaction."""
-        if not self.log_path.exists():
+        """
+        Update feedback for a specific interaction.
+        The log is append-only: a correction record is appended and folded
+        into the interaction it amends when the log is read.
+        """
+        if self._scores is None:
+            _, self._scores = self._scan()
+        if timestamp not in self._scores:
             return
 
-        lines = []
-        with open(self.log_path, "r") as f:
-            for line in f:
-                entry = json.loads(line)
-                if entry.get("timestamp") == timestamp:
-                    entry["user_feedback"] = feedback
-                    entry["quality_score"] = score
-                lines.append(json.dumps(entry, ensure_ascii=False))
+        previous = self._scores[timestamp]
+        if previous is None:
+            self._scored += 1
+        else:
+            self._total_score -= previous
+        self._total_score += score
+        self._scores[timestamp] = score
 
-        with open(self.log_path, "w") as f:
-            f.write("\n".join(lines) + "\n")
+        correction = {
+            "correction_for": timestamp,
+            "user_feedback": feedback,
+            "quality_score": score,
+        }
+        self._append(correction)
+        self._record_event()
 
     def get_count(self) -> int:
         """Get total interaction count."""
@@ -86,23 +322,9 @@ class InteractionCollector:
 
     def get_quality_stats(self) -> dict:
         """Get statistics on interaction quality."""
-        if not self.log_path.exists():
-            return {"total": 0, "scored": 0, "avg_score": 0}
-
-        total = 0
-        scored = 0
-        total_score = 0.0
-
-        with open(self.log_path, "r") as f:
-            for line in f:
-                entry = json.loads(line)
-                total += 1
-                if entry.get("quality_score") is not None:
-                    scored += 1
-                    total_score += entry["quality_score"]
-
+        scored = self._scored
         return {
-            "total": total,
+            "total": self._count,
             "scored": scored,
-            "avg_score": round(total_score / scored, 2) if scored > 0 else 0,
+            "avg_score": round(self._total_score / scored, 2) if scored > 0 else 0,
         }
@@ -3,15 +3,27 @@ SOVRA Evolution - Dataset Builder
 Filters and formats interaction logs into training data for LoRA fine-tuning.
 """
 
+import itertools
 import json
 import logging
 import os
+import re
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+
+import orjson
+
+from .collector import log_segments, open_log_segment
 
 logger = logging.getLogger(__name__)
 
+# Rows per Parquet row group; also the streaming write batch size
+_ROW_GROUP_SIZE = 8192
+
+# Negative feedback markers, matched in one case-insensitive scan
+_BAD_RE = re.compile(r"bad|wrong|incorrect|terrible", re.IGNORECASE)
+
 
 class DatasetBuilder:
     """
@@ -30,7 +42,7 @@ class DatasetBuilder:
             or os.getenv("INTERACTION_LOG_PATH", "./data/training/interactions.jsonl")
         )
         self.output_path = Path(
-            output_path or "./data/training/dataset.jsonl"
+            output_path or "./data/training/dataset.parquet"
         )
         self.min_samples = min_samples or int(
             os.getenv("EVOLUTION_MIN_SAMPLES", "200")
@@ -40,63 +52,139 @@ class DatasetBuilder:
         """
         Build a training dataset from interaction logs.
         Returns metadata about the build process.
+        The log is streamed through filter and format into the output file, so
+        memory stays bounded by min_samples rather than by the log size.
         """
-        if not self.interactions_path.exists():
+        segments = log_segments(self.interactions_path)
+        if not segments:
             logger.warning("No interaction logs found. Cannot build dataset.")
             return {"status": "no_data", "samples": 0}
 
-        # Read and filter interactions
-        raw_entries = []
-        with open(self.interactions_path, "r") as f:
-            for line in f:
-                try:
-                    entry = json.loads(line.strip())
-                    raw_entries.append(entry)
-                except json.JSONDecodeError:
-                    continue
-
-        logger.info(f"Loaded {len(raw_entries)} raw interactions.")
-
-        # Filter for quality
-        quality_entries = self._filter_quality(raw_entries)
-        logger.info(f"After quality filter: {len(quality_entries)} entries.")
-
-        if len(quality_entries) < self.min_samples:
+        corrections = self._load_corrections(segments)
+        loaded = 0
+
+        def read_entries() -> Iterator[dict]:
+            nonlocal loaded
+            for segment in segments:
+                with open_log_segment(segment) as f:
+                    for line in f:
+                        if b'"correction_for"' in line:
+                            continue
+                        try:
+                            entry = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            continue
+                        loaded += 1
+                        correction = corrections.get(entry.get("timestamp"))
+                        if correction is not None:
+                            entry["user_feedback"] = correction.get("user_feedback")
+                            entry["quality_score"] = correction.get("quality_score")
+                        yield entry
+
+        items = self._training_pairs(read_entries())
+
+        # Only enough samples to decide the min_samples gate are buffered
+        head = list(itertools.islice(items, self.min_samples))
+        if len(head) < self.min_samples:
+            logger.info(f"Loaded {loaded} raw interactions.")
+            logger.info(f"After quality filter: {len(head)} entries.")
             logger.warning(
-                f"Not enough quality samples: {len(quality_entries)}/{self.min_samples}. "
-                f"Need {self.min_samples - len(quality_entries)} more."
+                f"Not enough quality samples: {len(head)}/{self.min_samples}. "
+                f"Need {self.min_samples - len(head)} more."
             )
             return {
                 "status": "insufficient_data",
-                "samples": len(quality_entries),
+                "samples": len(head),
                 "needed": self.min_samples,
             }
 
-        # Format into training pairs
-        training_data = self._format_training_data(quality_entries)
-
         # Write output
         self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(self.output_path, "w") as f:
-            for item in training_data:
-                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        samples = self._write(itertools.chain(head, items))
 
-        logger.info(f"✅ Dataset built: {len(training_data)} training samples → {self.output_path}")
+        logger.info(f"Loaded {loaded} raw interactions.")
+        logger.info(f"After quality filter: {samples} entries.")
+        logger.info(f"✅ Dataset built: {samples} training samples → {self.output_path}")
 
         return {
             "status": "ready",
-            "samples": len(training_data),
+            "samples": samples,
             "output_path": str(self.output_path),
             "built_at": datetime.now().isoformat(),
         }
 
-    def _filter_quality(self, entries: list[dict]) -> list[dict]:
-        """Filter for high-quality interactions suitable for training."""
-        quality = []
+    def _load_corrections(self, segments: list[Path]) -> dict[str, dict]:
+        """
+        Collect appended feedback corrections, keyed by the interaction they
+        amend (the latest one wins). Only lines holding a correction are parsed.
+        """
+        corrections = {}
+        for segment in segments:
+            with open_log_segment(segment) as f:
+                for line in f:
+                    if b'"correction_for"' not in line:
+                        continue
+                    try:
+                        entry = orjson.loads(line)
+                    except orjson.JSONDecodeError:
+                        continue
+                    if "correction_for" in entry:
+                        corrections[entry["correction_for"]] = entry
+        return corrections
+
+    def _write(self, items: Iterable[dict]) -> int:
+        """
+        Stream the dataset to disk and return the number of samples written.
+        Written as Parquet (columnar, snappy-compressed, loads without per-row
+        JSON parsing), or as JSONL if the path says so or pyarrow is missing.
+        The file is written next to the target and renamed into place.
+        """
+        count = 0
+        if self.output_path.suffix == ".parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                logger.warning("pyarrow not installed, writing the dataset as JSONL instead.")
+                self.output_path = self.output_path.with_suffix(".jsonl")
+            else:
+                schema = pa.schema([
+                    ("instruction", pa.string()),
+                    ("input", pa.string()),
+                    ("output", pa.string()),
+                ])
+                tmp_path = self.output_path.with_suffix(".parquet.tmp")
+                with pq.ParquetWriter(
+                    tmp_path, schema, compression="snappy", use_dictionary=True
+                ) as writer:
+                    items = iter(items)
+                    while batch := list(itertools.islice(items, _ROW_GROUP_SIZE)):
+                        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                        count += len(batch)
+                os.replace(tmp_path, self.output_path)
+                return count
+
+        tmp_path = self.output_path.with_suffix(".jsonl.tmp")
+        with open(tmp_path, "wb") as f:
+            for item in items:
+                f.write(orjson.dumps(item) + b"\n")
+                count += 1
+        os.replace(tmp_path, self.output_path)
+        return count
+
+    def _training_pairs(self, entries: Iterable[dict]) -> Iterator[dict]:
+        """
+        Filter for high-quality interactions suitable for training and format
+        them into instruction-following training pairs, in a single pass.
+        """
         for entry in entries:
+            # Skip external API responses (we want to train local model behavior)
+            if entry.get("route") == "external":
+                continue
+
             # Skip entries with negative feedback
             feedback = entry.get("user_feedback", "")
-            if feedback and any(bad in feedback.lower() for bad in ["bad", "wrong", "incorrect", "terrible"]):
+            if feedback and _BAD_RE.search(feedback):
                 continue
 
             # Skip entries with very low quality score
@@ -114,28 +202,17 @@ class DatasetBuilder:
             if not user_input or len(user_input.strip()) < 5:
                 continue
 
-            # Skip external API responses (we want to train local model behavior)
-            if entry.get("route") == "external":
-                continue
-
-            quality.append(entry)
-
-        return quality
-
-    def _format_training_data(self, entries: list[dict]) -> list[dict]:
-        """Format filtered entries into instruction-following training pairs."""
-        training_data = []
-        for entry in entries:
-            item = {
-                "instruction": entry.get("user_input", ""),
+            yield {
+                "instruction": user_input,
                 "input": "",  # Optional context
-                "output": entry.get("llm_response", ""),
+                "output": response,
             }
-            training_data.append(item)
-        return training_data
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     logging.basicConfig(level=logging.INFO)
     builder = DatasetBuilder()
     result = builder.build()
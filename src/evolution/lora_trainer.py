@@ -4,6 +4,8 @@ Fine-tunes the local LLM using LoRA (Low-Rank Adaptation).
 Supports both CPU and GPU training.
 """
 
+import hashlib
+import importlib.util
 import json
 import logging
 import os
@@ -11,8 +13,20 @@ from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
 logger = logging.getLogger(__name__)
 
+_MAX_SEQ_LENGTH = 2048
+
+# Ollama model name -> HuggingFace model path
+_HF_MODELS = {
+    "qwen3:4b": "Qwen/Qwen3-4B",
+    "qwen3:4b-instruct": "Qwen/Qwen3-4B-Instruct",
+    "gemma3:4b": "google/gemma-3-4b-it",
+    "phi4-mini": "microsoft/phi-4-mini-instruct",
+}
+
 
 class LoRATrainer:
     """
@@ -26,7 +40,7 @@ class LoRATrainer:
         output_dir: Optional[str] = None,
         base_model: Optional[str] = None,
     ):
-        self.dataset_path = Path(dataset_path or "./data/training/dataset.jsonl")
+        self.dataset_path = Path(dataset_path or "./data/training/dataset.parquet")
         self.output_dir = Path(output_dir or "./data/evolution_history/lora_adapters")
         self.base_model = base_model or os.getenv("SOVRA_MODEL", "qwen3:4b")
 
@@ -35,35 +49,28 @@ class LoRATrainer:
         self.lora_alpha = int(os.getenv("LORA_ALPHA", "32"))
         self.lora_dropout = float(os.getenv("LORA_DROPOUT", "0.05"))
         self.target_modules = os.getenv("LORA_TARGET_MODULES", "q_proj,v_proj").split(",")
+        # QLoRA: load the frozen base model in 4-bit NF4 when training on CUDA
+        self.load_in_4bit = os.getenv("LORA_LOAD_IN_4BIT", "true").lower() == "true"
+        # Pack short samples into full-length sequences instead of padding them
+        self.packing = os.getenv("LORA_PACKING", "true").lower() == "true"
 
     def train(self) -> dict:
         """
         Run LoRA fine-tuning.
         Returns training metadata.
         """
-        if not self.dataset_path.exists():
+        dataset_path = self._resolve_dataset_path()
+        if dataset_path is None:
             logger.error(f"Training dataset not found: {self.dataset_path}")
             return {"status": "error", "message": "Dataset not found"}
 
-        # Load dataset
-        dataset = []
-        with open(self.dataset_path, "r") as f:
-            for line in f:
-                dataset.append(json.loads(line))
-
-        logger.info(f"🧬 Starting LoRA training with {len(dataset)} samples...")
-        logger.info(f"   Model: {self.base_model}")
-        logger.info(f"   LoRA r={self.lora_r}, alpha={self.lora_alpha}")
-        logger.info(f"   Target modules: {self.target_modules}")
-
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         adapter_dir = self.output_dir / f"adapter_{timestamp}"
-        adapter_dir.mkdir(parents=True, exist_ok=True)
 
         try:
             # Import training libraries
-            from datasets import Dataset
-            from peft import LoraConfig, get_peft_model, TaskType
+            import torch
+            from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training, TaskType
             from transformers import (
                 AutoModelForCausalLM,
                 AutoTokenizer,
@@ -74,45 +81,89 @@ class LoRATrainer:
             # Resolve model path (convert Ollama model name to HF path)
             hf_model = self._resolve_model_path()
 
-            logger.info(f"   HuggingFace model: {hf_model}")
+            # On CUDA: Unsloth's fused kernels if installed, else 4-bit base
+            # weights (if bitsandbytes is available); bf16/fp16 mixed precision.
+            # On CPU: plain PEFT in full precision, as before.
+            use_cuda = torch.cuda.is_available()
+            bf16 = use_cuda and torch.cuda.is_bf16_supported()
+            fast_model = self._fast_language_model() if use_cuda else None
 
-            # Load tokenizer and model
-            tokenizer = AutoTokenizer.from_pretrained(hf_model, trust_remote_code=True)
+            # Load tokenizer, then the dataset tokenized with it
+            if fast_model is not None:
+                model, tokenizer = fast_model.from_pretrained(
+                    hf_model,
+                    max_seq_length=_MAX_SEQ_LENGTH,
+                    load_in_4bit=self.load_in_4bit,
+                )
+            else:
+                tokenizer = AutoTokenizer.from_pretrained(hf_model, trust_remote_code=True)
             if tokenizer.pad_token is None:
                 tokenizer.pad_token = tokenizer.eos_token
 
-            model = AutoModelForCausalLM.from_pretrained(
-                hf_model,
-                trust_remote_code=True,
-                device_map="auto",
-            )
+            hf_dataset = self._prepare_dataset(dataset_path, tokenizer, hf_model)
 
-            # LoRA configuration
-            lora_config = LoraConfig(
-                task_type=TaskType.CAUSAL_LM,
-                r=self.lora_r,
-                lora_alpha=self.lora_alpha,
-                lora_dropout=self.lora_dropout,
-                target_modules=self.target_modules,
-                bias="none",
-            )
+            logger.info(f"🧬 Starting LoRA training with {len(hf_dataset)} samples...")
+            logger.info(f"   Model: {self.base_model}")
+            logger.info(f"   HuggingFace model: {hf_model}")
+            logger.info(f"   LoRA r={self.lora_r}, alpha={self.lora_alpha}")
+            logger.info(f"   Target modules: {self.target_modules}")
 
-            # Apply LoRA
-            model = get_peft_model(model, lora_config)
-            model.print_trainable_parameters()
+            adapter_dir.mkdir(parents=True, exist_ok=True)
+
+            if fast_model is not None:
+                logger.info("   Using Unsloth kernels")
+                model = fast_model.get_peft_model(
+                    model,
+                    r=self.lora_r,
+                    lora_alpha=self.lora_alpha,
+                    lora_dropout=self.lora_dropout,
+                    target_modules=self.target_modules,
+                    bias="none",
+                )
+            else:
+                quantize = (
+                    use_cuda
+                    and self.load_in_4bit
+                    and importlib.util.find_spec("bitsandbytes") is not None
+                )
 
-            # Prepare dataset
-            def format_sample(sample):
-                text = f"### Instruction:\n{sample['instruction']}\n\n"
-                if sample.get("input"):
-                    text += f"### Input:\n{sample['input']}\n\n"
-                text += f"### Response:\n{sample['output']}"
-                return {"text": text}
+                model_kwargs = {}
+                if quantize:
+                    from transformers import BitsAndBytesConfig
 
-            hf_dataset = Dataset.from_list(dataset)
-            hf_dataset = hf_dataset.map(format_sample)
+                    model_kwargs["quantization_config"] = BitsAndBytesConfig(
+                        load_in_4bit=True,
+                        bnb_4bit_quant_type="nf4",
+                        bnb_4bit_compute_dtype=torch.bfloat16 if bf16 else torch.float16,
+                        bnb_4bit_use_double_quant=True,
+                    )
+                    logger.info("   Loading base model in 4-bit (QLoRA)")
+
+                model = AutoModelForCausalLM.from_pretrained(
+                    hf_model,
+                    trust_remote_code=True,
+                    device_map="auto",
+                    **model_kwargs,
+                )
+                if quantize:
+                    model = prepare_model_for_kbit_training(model)
+
+                # LoRA configuration
+                lora_config = LoraConfig(
+                    task_type=TaskType.CAUSAL_LM,
+                    r=self.lora_r,
+                    lora_alpha=self.lora_alpha,
+                    lora_dropout=self.lora_dropout,
+                    target_modules=self.target_modules,
+                    bias="none",
+                )
+
+                # Apply LoRA
+                model = get_peft_model(model, lora_config)
+            model.print_trainable_parameters()
 
             # Training arguments (optimized for CPU/low-end GPU)
+            # Mixed precision on CUDA; full precision on CPU
             training_args = TrainingArguments(
                 output_dir=str(adapter_dir),
                 num_train_epochs=3,
@@ -123,9 +174,12 @@ class LoRATrainer:
                 logging_steps=10,
                 save_steps=100,
                 save_total_limit=2,
-                fp16=False,  # CPU-compatible
+                bf16=bf16,
+                fp16=use_cuda and not bf16,
                 report_to="none",
                 optim="adamw_torch",
+                # Without packing, batch samples of similar length to limit padding
+                group_by_length=not self.packing,
             )
 
             # Train
@@ -135,7 +189,8 @@ class LoRATrainer:
                 args=training_args,
                 tokenizer=tokenizer,
                 dataset_text_field="text",
-                max_seq_length=2048,
+                max_seq_length=_MAX_SEQ_LENGTH,
+                packing=self.packing,
             )
 
             trainer.train()
@@ -149,7 +204,7 @@ class LoRATrainer:
             return {
                 "status": "success",
                 "adapter_path": str(adapter_dir),
-                "samples": len(dataset),
+                "samples": len(hf_dataset),
                 "epochs": 3,
                 "timestamp": timestamp,
             }
@@ -162,19 +217,83 @@ class LoRATrainer:
             logger.error(f"Training failed: {e}")
             return {"status": "error", "message": str(e)}
 
+    @staticmethod
+    def _fast_language_model():
+        """Unsloth's FastLanguageModel, or None if Unsloth isn't installed."""
+        try:
+            from unsloth import FastLanguageModel
+        except ImportError:
+            return None
+        return FastLanguageModel
+
+    def _prepare_dataset(self, dataset_path: Path, tokenizer, hf_model: str):
+        """
+        Format and tokenize the dataset once and keep the token ids on disk.
+        Arrow memory-maps the saved dataset, so retraining on an unchanged
+        dataset with the same model skips formatting and tokenization, and
+        SFTTrainer uses the input_ids as they are instead of re-tokenizing.
+        """
+        from datasets import Dataset, load_from_disk
+
+        stat = dataset_path.stat()
+        key = hashlib.blake2b(
+            f"{dataset_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}:{hf_model}:{_MAX_SEQ_LENGTH}".encode(),
+            digest_size=8,
+        ).hexdigest()
+        cache_dir = dataset_path.parent / "tokenized" / key
+        if cache_dir.exists():
+            logger.info(f"   Using tokenized dataset cache: {cache_dir}")
+            return load_from_disk(str(cache_dir))
+
+        # Load dataset; Parquet is memory-mapped by Arrow with no JSON decoding
+        if dataset_path.suffix == ".parquet":
+            hf_dataset = Dataset.from_parquet(
+                str(dataset_path), columns=["instruction", "input", "output"]
+            )
+        else:
+            with open(dataset_path, "rb") as f:
+                hf_dataset = Dataset.from_list([orjson.loads(line) for line in f])
+
+        def format_and_tokenize(batch):
+            # Whole batches: one map call and one tokenizer call per 1000 samples
+            texts = [
+                f"### Instruction:\n{instruction}\n\n"
+                + (f"### Input:\n{extra}\n\n" if extra else "")
+                + f"### Response:\n{output}"
+                for instruction, extra, output in zip(
+                    batch["instruction"], batch["input"], batch["output"]
+                )
+            ]
+            return tokenizer(texts, truncation=True, max_length=_MAX_SEQ_LENGTH)
+
+        hf_dataset = hf_dataset.map(
+            format_and_tokenize,
+            batched=True,
+            batch_size=1000,
+            # Worker processes only pay off past a few thousand samples
+            num_proc=max(1, min(os.cpu_count() or 1, 4, len(hf_dataset) // 2000)),
+            remove_columns=hf_dataset.column_names,
+        )
+        hf_dataset.save_to_disk(str(cache_dir))
+        return hf_dataset
+
+    def _resolve_dataset_path(self) -> Optional[Path]:
+        """The configured dataset, or its JSONL twin if it was built without pyarrow."""
+        for path in (self.dataset_path, self.dataset_path.with_suffix(".jsonl")):
+            if path.exists():
+                return path
+        return None
+
     def _resolve_model_path(self) -> str:
         """Convert Ollama model name to HuggingFace model path."""
-        model_mapping = {
-            "qwen3:4b": "Qwen/Qwen3-4B",
-            "qwen3:4b-instruct": "Qwen/Qwen3-4B-Instruct",
-            "gemma3:4b": "google/gemma-3-4b-it",
-            "phi4-mini": "microsoft/phi-4-mini-instruct",
-        }
         base = self.base_model.split(":")[0] + ":" + self.base_model.split(":")[-1] if ":" in self.base_model else self.base_model
-        return model_mapping.get(base, f"Qwen/Qwen3-4B")
+        return _HF_MODELS.get(base, f"Qwen/Qwen3-4B")
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     logging.basicConfig(level=logging.INFO)
     trainer = LoRATrainer()
     result = trainer.train()
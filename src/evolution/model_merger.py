@@ -3,6 +3,7 @@ SOVRA Evolution - Model Merger & Evaluator
 Merges LoRA adapters into base model and evaluates quality.
 """
 
+import asyncio
 import json
 import logging
 import os
@@ -81,6 +82,9 @@ class ModelEvaluator:
             {"input": "What is 2 + 2?", "expects": ["4"]},
             {"input": "Summarize the concept of privacy in one sentence.", "expects": ["data", "personal", "control"]},
         ]
+        # Keywords lowered once, so each response is lowered once per check
+        for eval_item in self.eval_prompts:
+            eval_item["_expects_lc"] = [keyword.lower() for keyword in eval_item["expects"]]
 
     async def evaluate(self, model_name: str = "sovra-brain") -> dict:
         """Run evaluation suite against a model."""
@@ -91,12 +95,19 @@ class ModelEvaluator:
         total = len(self.eval_prompts)
         results = []
 
-        for eval_item in self.eval_prompts:
-            response = await self.llm.generate(eval_item["input"], temperature=0.1)
-            match = any(
-                keyword.lower() in response.lower()
-                for keyword in eval_item["expects"]
-            )
+        # The prompts are independent: send them concurrently, capped at the
+        # number of requests Ollama serves in parallel
+        semaphore = asyncio.Semaphore(int(os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+
+        async def generate(prompt: str) -> str:
+            async with semaphore:
+                return await self.llm.generate(prompt, temperature=0.1)
+
+        responses = await asyncio.gather(*(generate(p["input"]) for p in self.eval_prompts))
+
+        for eval_item, response in zip(self.eval_prompts, responses):
+            response_lc = response.lower()
+            match = any(keyword in response_lc for keyword in eval_item["_expects_lc"])
             passed += int(match)
             results.append({
                 "input": eval_item["input"],
@@ -118,6 +129,9 @@ class ModelEvaluator:
 
 
 if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
     logging.basicConfig(level=logging.INFO)
     import sys
     if "--rollback" in sys.argv:
@@ -5,9 +5,10 @@ This is the glue that connects everything together.
 """
 
 import asyncio
+import contextlib
 import json
 import logging
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from ..brain.llm_client import LLMClient
 from ..brain.personality import PersonalityEngine
@@ -26,6 +27,9 @@ from ..security.secret_vault import SecretVault
 
 logger = logging.getLogger(__name__)
 
+# Exchanges waiting for post-processing; the oldest is dropped when full
+_POST_QUEUE_SIZE = 1024
+
 
 class OpenClawBridge:
     """
@@ -51,6 +55,9 @@ class OpenClawBridge:
             api_filter=self.api_filter, rag_pipeline=self.rag,
         )
 
+        # Evolution
+        self.collector = InteractionCollector()
+
         # Autonomy
         self.goal_planner = GoalPlanner(self.llm, self.prompt_builder)
         self.execution_loop = ExecutionLoop(
@@ -59,31 +66,48 @@ class OpenClawBridge:
         self.self_reflection = SelfReflection(
             self.llm, self.prompt_builder, self.goal_planner, memory_store=self.rag
         )
-        self.scheduler = ProactiveScheduler(self.goal_planner, self.personality)
+        self.scheduler = ProactiveScheduler(
+            self.goal_planner, self.personality,
+            interaction_count=self.collector.get_count,
+        )
 
         # Wire up reflection callback
         self.execution_loop.set_reflection_callback(self.self_reflection.reflect)
 
-        # Evolution
-        self.collector = InteractionCollector()
-
         # Security
         self.vault = SecretVault()
 
+        # Post-processing runs in one long-lived worker fed by a bounded
+        # queue, instead of a new task per message
+        self._post_q: asyncio.Queue = asyncio.Queue(maxsize=_POST_QUEUE_SIZE)
+        self._post_task: Optional[asyncio.Task] = None
+
         logger.info(f"🧠 SOVRA Bridge initialized: {self.personality.name}")
 
     async def handle_message(self, user_message: str, platform: str = "web") -> str:
         """
         Handle an incoming message from any platform.
         OpenClaw-first: single LLM call, no routing overhead.
+        Returns the whole reply; see stream_message for incremental output.
+        """
+        return "".join([chunk async for chunk in self.stream_message(user_message, platform)])
+
+    async def stream_message(
+        self, user_message: str, platform: str = "web"
+    ) -> AsyncIterator[str]:
+        """
+        Handle an incoming message, yielding the reply as Ollama generates it
+        so transports can forward the first tokens without waiting for the rest.
         """
         logger.info(f"📨 [{platform}] User: {user_message[:100]}...")
 
         # Handle /secret commands directly
         if user_message.strip().startswith("/secret"):
             cmd_body = user_message.strip()[len("/secret"):].strip()
-            return self.vault.handle_command(cmd_body)
+            yield self.vault.handle_command(cmd_body)
+            return
 
+        parts: list[str] = []
         try:
             # Mask secrets before LLM sees the message
             masked_message = self.vault.mask(user_message)
@@ -95,32 +119,77 @@ class OpenClawBridge:
             history = self.memory.get_short_term_history()
             messages = history + [{"role": "user", "content": masked_message}]
 
-            # Single LLM call — direct to Ollama
-            response = await self.llm.chat(messages, system=system_prompt)
-
-            # Unmask secrets in response (for execution context)
-            response = self.vault.unmask(response)
-
-            if not response or not response.strip():
-                response = "Hmm, aku butuh waktu sebentar untuk berpikir. Coba tanya lagi ya! 😊"
+            # Single streamed LLM call — direct to Ollama. Secrets are
+            # unmasked per chunk (for execution context); a placeholder split
+            # across chunks is held back until it is complete.
+            hold = self.vault.placeholder_length
+            pending = ""
+            async for token in self.llm.chat_stream(messages, system=system_prompt):
+                pending += token
+                cut = pending.rfind("[")
+                if cut == -1 or "]" in pending[cut:] or len(pending) - cut > hold:
+                    cut = len(pending)
+                if cut:
+                    chunk = self.vault.unmask(pending[:cut])
+                    pending = pending[cut:]
+                    parts.append(chunk)
+                    yield chunk
+            if pending:
+                chunk = self.vault.unmask(pending)
+                parts.append(chunk)
+                yield chunk
+
+            if not "".join(parts).strip():
+                chunk = "Hmm, aku butuh waktu sebentar untuk berpikir. Coba tanya lagi ya! 😊"
+                parts.append(chunk)
+                yield chunk
 
         except Exception as e:
             logger.error(f"LLM call failed: {e}")
-            response = "⚠️ Maaf, ada masalah teknis. Coba lagi ya."
-
+            chunk = "⚠️ Maaf, ada masalah teknis. Coba lagi ya."
+            yield chunk
+            if parts:
+                # The reply broke off mid-stream; don't remember or log it
+                return
+            parts.append(chunk)
+
+        response = "".join(parts)
         logger.info(f"📤 [{platform}] Sovra: {response[:100]}...")
 
-        # Post-process async (non-blocking — response already sent)
-        asyncio.create_task(self._post_process(user_message, response, platform))
+        # Short-term memory is two deque appends; do it now so the next
+        # message already sees this exchange in its history
+        self.memory.add_to_short_term("user", user_message)
+        self.memory.add_to_short_term("assistant", response)
 
-        return response
+        # Post-process async (non-blocking — response already sent)
+        self._enqueue_post_process(user_message, response, platform)
+
+    def _enqueue_post_process(self, user_message: str, response: str, platform: str):
+        """Hand an exchange to the post-process worker, starting it if needed."""
+        self._start_post_worker()
+        if self._post_q.full():
+            self._post_q.get_nowait()
+            self._post_q.task_done()
+            logger.warning("Post-process queue full, dropped the oldest exchange.")
+        self._post_q.put_nowait((user_message, response, platform))
+
+    def _start_post_worker(self):
+        if self._post_task is None or self._post_task.done():
+            self._post_task = asyncio.create_task(self._post_worker())
+
+    async def _post_worker(self):
+        """Background worker: post-process queued exchanges one at a time."""
+        while True:
+            user_message, response, platform = await self._post_q.get()
+            try:
+                await self._post_process(user_message, response, platform)
+            finally:
+                self._post_q.task_done()
 
     async def _post_process(self, user_message: str, response: str, platform: str):
-        """Background: save memory + log interaction. Non-blocking."""
+        """Background: log interaction + save long-term memory. Non-blocking."""
         try:
-            self.memory.add_to_short_term("user", user_message)
-            self.memory.add_to_short_term("assistant", response)
-            await self.memory.commit_to_long_term(user_message, response)
+            # Only queues the record, so it is logged even if the commit fails
             self.collector.log_interaction(
                 user_input=user_message,
                 system_prompt="",
@@ -128,6 +197,7 @@ class OpenClawBridge:
                 route="direct",
                 metadata={"platform": platform},
             )
+            await self.memory.commit_to_long_term(user_message, response)
         except Exception as e:
             logger.warning(f"Post-process failed (non-critical): {e}")
 
@@ -150,6 +220,9 @@ class OpenClawBridge:
             logger.error("❌ Ollama is not available! Start Ollama first.")
             raise ConnectionError("Cannot connect to Ollama")
 
+        # Start the post-process worker
+        self._start_post_worker()
+
         # Start scheduler
         self.scheduler.start()
         logger.info("✅ Proactive scheduler started")
@@ -169,8 +242,17 @@ class OpenClawBridge:
         logger.info("⏹️ Stopping SOVRA...")
         await self.execution_loop.stop()
         self.scheduler.stop()
+        # Let queued exchanges reach memory and the log before shutting down
+        if self._post_task is not None:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._post_q.join(), timeout=10)
+            self._post_task.cancel()
+            self._post_task = None
         await self.llm.close()
         await self.api_filter.close()
+        self.collector.close()
+        self.rag.save_index()
+        self.vault.flush()
         logger.info("👋 SOVRA stopped. Goodbye.")
 
     def get_status(self) -> dict:
@@ -18,7 +18,10 @@ from rich.console import Console
 from rich.panel import Panel
 from rich.logging import RichHandler
 
-# Load environment
+# Load environment before any src module is imported: some read os.environ
+# into module-level constants at import time, the rest when their classes
+# are constructed. Standalone entry points (python -m src.evolution.*) load
+# .env themselves.
 load_dotenv()
 
 # Configure logging
@@ -40,6 +43,43 @@ logger = logging.getLogger("sovra")
 console = Console()
 
 
+class _ConsoleReader:
+    """
+    Reads stdin lines on the event loop: the loop watches stdin and reads it
+    when a line arrives, so no executor thread sits blocked in input().
+    """
+
+    def __init__(self):
+        self._fd = sys.stdin.fileno()
+        self._buf = b""
+
+    async def readline(self, prompt: str) -> str:
+        loop = asyncio.get_running_loop()
+        sys.stdout.write(prompt)
+        sys.stdout.flush()
+        while (nl := self._buf.find(b"\n")) == -1:
+            readable = loop.create_future()
+            try:
+                loop.add_reader(
+                    self._fd, lambda: readable.done() or readable.set_result(None)
+                )
+            except NotImplementedError:
+                # Windows event loops can't watch stdin
+                return await asyncio.to_thread(input)
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self._fd)
+            chunk = os.read(self._fd, 4096)
+            if not chunk:
+                if not self._buf:
+                    raise EOFError
+                chunk = b"\n"  # Last line without a newline
+            self._buf += chunk
+        line, self._buf = self._buf[:nl], self._buf[nl + 1:]
+        return line.decode(errors="replace").rstrip("\r")
+
+
 async def main():
     """Main entry point for SOVRA."""
     console.print(
@@ -89,11 +129,10 @@ async def main():
             console.print(f"[dim]Type a message to chat, '/status' for status, 'quit' to exit.[/]\n")
 
             # Interactive shell for direct testing
+            reader = _ConsoleReader()
             while not shutdown_event.is_set():
                 try:
-                    user_input = await asyncio.get_event_loop().run_in_executor(
-                        None, lambda: input("You: ")
-                    )
+                    user_input = await reader.readline("You: ")
                     if not user_input.strip():
                         continue
                     if user_input.strip().lower() in ("quit", "exit", "bye"):
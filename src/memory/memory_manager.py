@@ -4,11 +4,12 @@ Manages short-term and long-term memory lifecycle.
 Handles conversation buffers, consolidation, and importance scoring.
 """
 
+import asyncio
 import json
 import logging
 import os
+import time
 from collections import deque
-from datetime import datetime
 from typing import Optional
 
 from ..brain.llm_client import LLMClient
@@ -37,18 +38,22 @@ class MemoryManager:
             os.getenv("MEMORY_SHORT_TERM_SIZE", "20")
         )
         self.short_term: deque[dict] = deque(maxlen=self.short_term_size)
+        # The same messages as {"role", "content"} chat dicts, built once on
+        # insert and evicted in step with short_term
+        self._history: deque[dict] = deque(maxlen=self.short_term_size)
 
     def add_to_short_term(self, role: str, content: str):
         """Add a message to short-term memory."""
         self.short_term.append({
             "role": role,
             "content": content,
-            "timestamp": datetime.now().isoformat(),
+            "ts_ms": time.time_ns() // 1_000_000,
         })
+        self._history.append({"role": role, "content": content})
 
     def get_short_term_history(self) -> list[dict]:
         """Get the current conversation history."""
-        return [{"role": m["role"], "content": m["content"]} for m in self.short_term]
+        return list(self._history)
 
     def get_short_term_context(self) -> str:
         """Get short-term memory as a formatted string."""
@@ -89,8 +94,13 @@ class MemoryManager:
 
         # Group memories and create summaries
         batch_size = 10
-        for i in range(0, len(results), batch_size):
-            batch = results[i : i + batch_size]
+        batches = [results[i : i + batch_size] for i in range(0, len(results), batch_size)]
+
+        # Summaries are independent: generate them concurrently, capped at
+        # the number of requests Ollama serves in parallel
+        semaphore = asyncio.Semaphore(int(os.getenv("OLLAMA_NUM_PARALLEL", "4")))
+
+        async def summarize(batch: list[dict]) -> str:
             content = "\n---\n".join([r["content"] for r in batch])
 
             # Use LLM to summarize
@@ -102,17 +112,27 @@ Memories:
 
 Provide a concise summary:"""
 
-            summary = await self.llm.generate(prompt, temperature=0.3)
-
-            # Store summary and delete originals
-            await self.rag.store(
-                summary,
-                metadata={"type": "consolidated_memory", "original_count": len(batch)},
-            )
+            async with semaphore:
+                return await self.llm.generate(prompt, temperature=0.3)
+
+        summaries = await asyncio.gather(*(summarize(batch) for batch in batches))
+
+        # Store summaries (one embedding request) and delete originals
+        ts_ms = time.time_ns() // 1_000_000
+        await self.rag.store_batch(
+            list(summaries),
+            metadatas=[
+                {
+                    "ts_ms": ts_ms,
+                    "source": "conversation",
+                    "type": "consolidated_memory",
+                    "original_count": len(batch),
+                }
+                for batch in batches
+            ],
+        )
 
-            for r in batch:
-                if r.get("id"):
-                    await self.rag.delete(r["id"])
+        await self.rag.delete_many([r["id"] for r in results if r.get("id")])
 
         logger.info(f"🧠 Consolidated {len(results)} memories into summaries.")
 
@@ -127,4 +147,5 @@ Provide a concise summary:"""
     def clear_short_term(self):
         """Clear short-term memory."""
         self.short_term.clear()
+        self._history.clear()
         logger.info("Short-term memory cleared.")
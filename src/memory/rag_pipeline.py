@@ -3,20 +3,291 @@ SOVRA Memory - RAG Pipeline
 Ingestion, embedding, storage, and retrieval of knowledge using ChromaDB.
 """
 
+import asyncio
 import logging
 import os
-from datetime import datetime
+import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 from uuid import uuid4
 
-import chromadb
-from chromadb.config import Settings
+import numpy as np
+import orjson
 
 from ..brain.llm_client import LLMClient
 
 logger = logging.getLogger(__name__)
 
+# Rows upcast per step when scoring a float16 index
+_SCORE_BLOCK_ROWS = 4096
+
+# SimHash signature width; signatures are stored as uint64 words
+_SKETCH_BITS = 256
+
+# Query embeddings remembered for callers embedding the same text
+_QUERY_EMBEDDING_MEMO = 64
+
+
+def _popcount_rows(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a (n, w) uint64 array."""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(words).sum(axis=1, dtype=np.uint32)
+    return np.unpackbits(words.view(np.uint8), axis=1).sum(axis=1, dtype=np.uint32)
+
+
+class _QueryCache:
+    """
+    Recent search results, looked up by exact query text or by a query
+    embedding within cosine `threshold` of a cached one. Entries live in a
+    fixed ring, so the oldest is evicted first. Any write to the collection
+    must clear it.
+    """
+
+    def __init__(self, capacity: int, threshold: float):
+        self.capacity = capacity
+        self.threshold = threshold
+        self._slots: dict[tuple[str, int], int] = {}
+        self._entries: list[Optional[tuple[tuple[str, int], list[dict]]]] = [None] * capacity
+        self._embs: Optional[np.ndarray] = None  # (capacity, dim), L2-normalized rows
+        self._size = 0
+        self._next = 0
+
+    def get(self, query: str, k: int) -> Optional[list[dict]]:
+        slot = self._slots.get((query, k))
+        return None if slot is None else list(self._entries[slot][1])
+
+    def get_similar(self, q: np.ndarray, k: int) -> Optional[list[dict]]:
+        """Results of the closest cached query, if it is close enough; q is normalized."""
+        if self._size == 0 or self._embs.shape[1] != q.shape[0]:
+            return None
+        sims = self._embs[: self._size] @ q
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return None
+        key, results = self._entries[best]
+        return list(results) if key[1] == k else None
+
+    def put(self, query: str, k: int, q: np.ndarray, results: list[dict]):
+        if self.capacity <= 0:
+            return
+        if self._embs is None or self._embs.shape[1] != q.shape[0]:
+            self.clear()
+            self._embs = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+        slot = self._next
+        evicted = self._entries[slot]
+        if evicted is not None:
+            self._slots.pop(evicted[0], None)
+        self._entries[slot] = ((query, k), results)
+        self._embs[slot] = q
+        self._slots[(query, k)] = slot
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        self._slots.clear()
+        self._entries = [None] * self.capacity
+        self._size = 0
+        self._next = 0
+
+
+class _VectorIndex:
+    """
+    In-process mirror of the collection: L2-normalized embeddings in one
+    contiguous float32 matrix (so cosine similarity is a dot product), with
+    ids, documents and metadata alongside. For a personal-memory sized
+    collection, one matrix-vector product and a partial sort beat a Chroma
+    query round trip.
+    With dtype=float16 the matrix takes half the memory, but NumPy has no
+    float16 BLAS kernel, so it is scored in float32 blocks and searches are
+    several times slower.
+    Each row also gets a 256-bit SimHash signature (signs of a fixed random
+    projection). With `sketch_min_docs` set, searches over at least that
+    many rows first shortlist candidates by Hamming distance to the query's
+    signature, which is much cheaper than a full scan, and then rank only
+    those exactly. This is approximate, so it is off (0) by default.
+    The index can be saved to a directory and loaded back memory-mapped, so a
+    restart doesn't have to pull every embedding out of Chroma again.
+    """
+
+    def __init__(self, dtype=np.float32, sketch_min_docs: int = 0):
+        self.dtype = np.dtype(dtype)
+        self.sketch_min_docs = sketch_min_docs
+        self._matrix: Optional[np.ndarray] = None  # (capacity, dim); rows past len() unused
+        self._sigs: Optional[np.ndarray] = None  # (capacity, _SKETCH_BITS // 64) uint64
+        self._projection: Optional[np.ndarray] = None  # (dim, _SKETCH_BITS)
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        self._rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: list[str], embeddings, documents: list[str], metadatas: list[dict]):
+        vecs = np.asarray(embeddings, dtype=np.float32)
+        if vecs.ndim != 2 or not len(vecs):
+            return
+        # Like Chroma's add, ids that are already present are ignored
+        rows, seen = self._rows, set()
+        keep = [
+            i for i, doc_id in enumerate(ids)
+            if doc_id not in rows and not (doc_id in seen or seen.add(doc_id))
+        ]
+        if len(keep) < len(ids):
+            if not keep:
+                return
+            vecs = vecs[keep]
+            ids = [ids[i] for i in keep]
+            documents = [documents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        vecs /= np.where(norms > 0, norms, 1.0)
+
+        start = len(self.ids)
+        end = start + len(vecs)
+        if self._matrix is None:
+            capacity = max(1024, end)
+            self._matrix = np.empty((capacity, vecs.shape[1]), dtype=self.dtype)
+            self._sigs = np.empty((capacity, _SKETCH_BITS // 64), dtype=np.uint64)
+            self._projection = self._make_projection(vecs.shape[1])
+        elif end > len(self._matrix):
+            # Grow by doubling so appends stay amortized O(1)
+            capacity = max(end, 2 * len(self._matrix))
+            grown = np.empty((capacity, self._matrix.shape[1]), dtype=self.dtype)
+            grown[:start] = self._matrix[:start]
+            self._matrix = grown
+            grown_sigs = np.empty((capacity, self._sigs.shape[1]), dtype=np.uint64)
+            grown_sigs[:start] = self._sigs[:start]
+            self._sigs = grown_sigs
+        self._matrix[start:end] = vecs
+        self._sigs[start:end] = self._signatures(vecs)
+
+        for offset, doc_id in enumerate(ids):
+            self._rows[doc_id] = start + offset
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+    def remove(self, doc_id: str):
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return
+        # Move the last row into the hole so rows stay contiguous
+        last = len(self.ids) - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            self._sigs[row] = self._sigs[last]
+            self.ids[row] = self.ids[last]
+            self.documents[row] = self.documents[last]
+            self.metadatas[row] = self.metadatas[last]
+            self._rows[self.ids[row]] = row
+        self.ids.pop()
+        self.documents.pop()
+        self.metadatas.pop()
+
+    @staticmethod
+    def _make_projection(dim: int) -> np.ndarray:
+        # Fixed seed, so saved signatures stay valid across restarts
+        return np.random.default_rng(0).standard_normal((dim, _SKETCH_BITS)).astype(np.float32)
+
+    def save(self, directory: Path):
+        """Write the rows and their documents to `directory`, replacing any previous copy."""
+        n = len(self.ids)
+        if not n:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {
+            "vectors.npy": lambda f: np.save(f, self._matrix[:n]),
+            "signatures.npy": lambda f: np.save(f, self._sigs[:n]),
+            "documents.json": lambda f: f.write(orjson.dumps({
+                "ids": self.ids,
+                "documents": self.documents,
+                "metadatas": self.metadatas,
+            })),
+        }
+        for name, write in files.items():
+            tmp_path = directory / f"{name}.tmp"
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, directory / name)
+
+    @classmethod
+    def load(cls, directory: Path, dtype, sketch_min_docs: int = 0) -> Optional["_VectorIndex"]:
+        """
+        Load a saved index, or None if there is none usable. The vectors are
+        memory-mapped copy-on-write: pages are read on first use and shared
+        with the page cache, and later changes stay private to this process.
+        """
+        try:
+            matrix = np.load(directory / "vectors.npy", mmap_mode="c")
+            sigs = np.load(directory / "signatures.npy", mmap_mode="c")
+            saved = orjson.loads((directory / "documents.json").read_bytes())
+        except (OSError, ValueError, orjson.JSONDecodeError):
+            return None
+        ids = saved.get("ids", [])
+        if matrix.dtype != np.dtype(dtype) or not len(ids) == len(matrix) == len(sigs):
+            return None
+
+        index = cls(dtype, sketch_min_docs)
+        index._matrix = matrix
+        index._sigs = sigs
+        index._projection = cls._make_projection(matrix.shape[1])
+        index.ids = ids
+        index.documents = saved["documents"]
+        index.metadatas = saved["metadatas"]
+        index._rows = {doc_id: row for row, doc_id in enumerate(ids)}
+        return index
+
+    def _signatures(self, vecs: np.ndarray) -> np.ndarray:
+        bits = np.packbits(vecs @ self._projection > 0, axis=1)
+        return bits.view(np.uint64)
+
+    def search(self, q: np.ndarray, k: int) -> list[dict]:
+        """Top-k documents by cosine similarity to the normalized query q."""
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return []
+        k = min(k, n)
+
+        shortlist = max(20 * k, 256)
+        if self.sketch_min_docs and n >= self.sketch_min_docs and shortlist < n:
+            # Stage 1: Hamming distance between signatures picks the candidates
+            q_sig = self._signatures(q[np.newaxis])
+            distances = _popcount_rows(self._sigs[:n] ^ q_sig)
+            rows = np.argpartition(distances, shortlist - 1)[:shortlist]
+            # Stage 2: exact cosine on the candidates only
+            scores = self._matrix[rows].astype(np.float32, copy=False) @ q
+        else:
+            rows = None
+            if self.dtype == np.float32:
+                scores = self._matrix[:n] @ q
+            else:
+                scores = np.empty(n, dtype=np.float32)
+                for i in range(0, n, _SCORE_BLOCK_ROWS):
+                    block = self._matrix[i : min(i + _SCORE_BLOCK_ROWS, n)]
+                    scores[i : i + len(block)] = block.astype(np.float32) @ q
+
+        m = len(scores)
+        top = np.argpartition(-scores, k - 1)[:k] if k < m else np.arange(m)
+        top = top[np.argsort(-scores[top])]
+        best = top if rows is None else rows[top]
+        return [
+            {
+                "content": self.documents[i],
+                "metadata": self.metadatas[i],
+                "id": self.ids[i],
+                "distance": float(1.0 - score),
+            }
+            for i, score in zip(best.tolist(), scores[top].tolist())
+        ]
+
+
+def _normalize(embedding) -> np.ndarray:
+    v = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
 
 class RAGPipeline:
     """
@@ -33,21 +304,85 @@ class RAGPipeline:
         self.llm = llm_client
         self.persist_path = persist_path or os.getenv("CHROMADB_PATH", "./data/chromadb")
         self.top_k = int(os.getenv("RAG_TOP_K", "5"))
+        # Repeated and near-identical queries skip the embedding call and the
+        # Chroma query until the next write to the collection
+        self._query_cache = _QueryCache(
+            capacity=int(os.getenv("RAG_QUERY_CACHE_SIZE", "256")),
+            threshold=float(os.getenv("RAG_QUERY_CACHE_SIMILARITY", "0.97")),
+        )
+        # Recent query embedding requests (finished or in flight), so callers
+        # embedding the same text, like the router and search, share one
+        self._query_embeddings: OrderedDict[str, asyncio.Task] = OrderedDict()
+
+        # Initialize ChromaDB client with persistence; imported here so that
+        # importing this module doesn't pull in chromadb's large import graph
+        import chromadb
 
-        # Initialize ChromaDB client with persistence
         Path(self.persist_path).mkdir(parents=True, exist_ok=True)
         self.client = chromadb.PersistentClient(path=self.persist_path)
 
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"description": "SOVRA long-term memory"},
+            metadata={"description": "SOVRA long-term memory", "hnsw:space": "cosine"},
         )
+        # The space is fixed when a collection is created; older ones use L2
+        self._cosine_space = (self.collection.metadata or {}).get("hnsw:space") == "cosine"
+
+        # Unfiltered searches run against an in-process copy of the vectors
+        # while the collection is small; Chroma remains the store of record
+        self._index_max_docs = int(os.getenv("RAG_INDEX_MAX_DOCS", "50000"))
+        self._index_dtype = np.dtype(os.getenv("RAG_INDEX_DTYPE", "float32"))
+        self._sketch_min_docs = int(os.getenv("RAG_SKETCH_MIN_DOCS", "0"))
+        self._index_path = Path(self.persist_path) / "sovra_index"
+        self._index = self._load_index()
 
         logger.info(
             f"RAG initialized: {self.collection.count()} documents in memory, "
             f"persist_path={self.persist_path}"
         )
 
+    def _load_index(self) -> Optional[_VectorIndex]:
+        """Mirror the collection into a _VectorIndex, or None if it's too large."""
+        if self.collection.count() > self._index_max_docs:
+            return None
+
+        # The copy saved at the last shutdown is used if it still holds
+        # exactly the collection's documents (fetching ids alone is cheap)
+        index = _VectorIndex.load(self._index_path, self._index_dtype, self._sketch_min_docs)
+        if index is not None:
+            if set(index.ids) == set(self.collection.get(include=[])["ids"]):
+                logger.info(f"Loaded saved vector index ({len(index)} documents).")
+                return index
+            logger.info("Saved vector index is out of date; rebuilding from ChromaDB.")
+
+        index = _VectorIndex(self._index_dtype, self._sketch_min_docs)
+        data = self.collection.get(include=["embeddings", "documents", "metadatas"])
+        if data["ids"]:
+            index.add(
+                data["ids"],
+                data["embeddings"],
+                data["documents"],
+                [m or {} for m in data["metadatas"]],
+            )
+        return index
+
+    def save_index(self):
+        """Save the in-process index so the next start can memory-map it."""
+        if self._index is None:
+            return
+        try:
+            self._index.save(self._index_path)
+        except OSError as e:
+            logger.warning(f"Failed to save vector index: {e}")
+
+    def _index_add(self, ids: list[str], embeddings, documents: list[str], metadatas: list[dict]):
+        if self._index is None:
+            return
+        self._index.add(ids, embeddings, documents, metadatas)
+        if len(self._index) > self._index_max_docs:
+            logger.info(f"Memory passed {self._index_max_docs} documents; searching via ChromaDB only.")
+            self._index = None
+
     async def store(
         self,
         content: str,
@@ -61,7 +396,8 @@ class RAGPipeline:
         embedding = await self.llm.embeddings(content)
 
         meta = {
-            "timestamp": datetime.now().isoformat(),
+            # Milliseconds since the epoch: compact, and filterable with $gt/$lt
+            "ts_ms": time.time_ns() // 1_000_000,
             "source": "conversation",
             **(metadata or {}),
         }
@@ -72,6 +408,8 @@ class RAGPipeline:
             metadatas=[meta],
             ids=[doc_id],
         )
+        self._index_add([doc_id], [embedding], [content], [meta])
+        self._query_cache.clear()
 
         logger.debug(f"Stored document [{doc_id}]: {content[:80]}...")
         return doc_id
@@ -79,12 +417,13 @@ class RAGPipeline:
     async def store_batch(
         self, documents: list[str], metadatas: Optional[list[dict]] = None
     ) -> list[str]:
-        """Store multiple documents at once."""
+        """Store multiple documents at once, embedded in a single request."""
         ids = [str(uuid4())[:12] for _ in documents]
-        embeddings = [await self.llm.embeddings(doc) for doc in documents]
+        embeddings = await self.llm.embeddings_batch(documents)
 
         if not metadatas:
-            metadatas = [{"timestamp": datetime.now().isoformat()} for _ in documents]
+            ts_ms = time.time_ns() // 1_000_000
+            metadatas = [{"ts_ms": ts_ms} for _ in documents]
 
         self.collection.add(
             documents=documents,
@@ -92,42 +431,100 @@ class RAGPipeline:
             metadatas=metadatas,
             ids=ids,
         )
+        self._index_add(ids, embeddings, documents, metadatas)
+        self._query_cache.clear()
 
         logger.info(f"Stored {len(documents)} documents in batch.")
         return ids
 
+    async def embed_query(self, text: str) -> list[float]:
+        """Embed a query, sharing one request among concurrent and repeated callers."""
+        task = self._query_embeddings.get(text)
+        if task is None:
+            task = asyncio.ensure_future(self.llm.embeddings(text))
+            task.add_done_callback(lambda t: self._forget_failed_embedding(text, t))
+            self._query_embeddings[text] = task
+            if len(self._query_embeddings) > _QUERY_EMBEDDING_MEMO:
+                self._query_embeddings.popitem(last=False)
+        else:
+            self._query_embeddings.move_to_end(text)
+        # Shielded: one caller being cancelled mustn't cancel the others' request
+        return await asyncio.shield(task)
+
+    def _forget_failed_embedding(self, text: str, task: asyncio.Task):
+        if (task.cancelled() or task.exception() is not None) and self._query_embeddings.get(text) is task:
+            del self._query_embeddings[text]
+
     async def search(
         self,
         query: str,
         top_k: Optional[int] = None,
         filter_metadata: Optional[dict] = None,
     ) -> list[dict]:
-        """Search for relevant documents using semantic similarity."""
+        """
+        Search for relevant documents using semantic similarity. Each result's
+        "distance" is the cosine distance (1 - cosine similarity) to the query.
+        """
         k = top_k or self.top_k
 
+        # Filtered searches are rare; only unfiltered ones are cached
+        cacheable = not filter_metadata
+        if cacheable:
+            cached = self._query_cache.get(query, k)
+            if cached is not None:
+                return cached
+
         # Generate query embedding
-        query_embedding = await self.llm.embeddings(query)
+        query_embedding = await self.embed_query(query)
+
+        if cacheable:
+            q = _normalize(query_embedding)
+            cached = self._query_cache.get_similar(q, k)
+            if cached is not None:
+                logger.debug(f"RAG search for '{query[:50]}...' served from a similar cached query")
+                return cached
+
+        if cacheable and self._index is not None:
+            documents = self._index.search(q, k)
+            self._query_cache.put(query, k, q, documents)
+            logger.debug(f"RAG search for '{query[:50]}...' returned {len(documents)} results")
+            return list(documents)
 
         where_filter = filter_metadata if filter_metadata else None
 
+        include = ["documents", "metadatas", "distances"]
+        if not self._cosine_space:
+            # Chroma reports L2 here; recompute cosine from the embeddings
+            include.append("embeddings")
         results = self.collection.query(
             query_embeddings=[query_embedding],
             n_results=k,
             where=where_filter,
+            include=include,
         )
 
         documents = []
         if results and results["documents"]:
-            for i, doc in enumerate(results["documents"][0]):
-                documents.append({
-                    "content": doc,
-                    "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
-                    "id": results["ids"][0][i] if results["ids"] else "",
-                    "distance": results["distances"][0][i] if results.get("distances") else None,
-                })
+            # Bind each column once and walk them together
+            docs = results["documents"][0]
+            metas = results["metadatas"][0] if results["metadatas"] else [{}] * len(docs)
+            ids = results["ids"][0] if results["ids"] else [""] * len(docs)
+            dists = results["distances"][0] if results.get("distances") else [None] * len(docs)
+            if not self._cosine_space and results.get("embeddings") is not None and len(docs):
+                vecs = np.asarray(results["embeddings"][0], dtype=np.float32)
+                norms = np.linalg.norm(vecs, axis=1)
+                sims = vecs @ _normalize(query_embedding) / np.where(norms > 0, norms, 1.0)
+                dists = (1.0 - sims).tolist()
+            documents = [
+                {"content": doc, "metadata": meta, "id": doc_id, "distance": dist}
+                for doc, meta, doc_id, dist in zip(docs, metas, ids, dists)
+            ]
+
+        if cacheable:
+            self._query_cache.put(query, k, q, documents)
 
         logger.debug(f"RAG search for '{query[:50]}...' returned {len(documents)} results")
-        return documents
+        return list(documents)
 
     async def store_conversation(
         self, user_message: str, assistant_response: str, context: str = ""
@@ -152,13 +549,30 @@ class RAGPipeline:
     async def delete(self, doc_id: str):
         """Delete a specific document from memory."""
         self.collection.delete(ids=[doc_id])
+        if self._index is not None:
+            self._index.remove(doc_id)
+        self._query_cache.clear()
         logger.debug(f"Deleted document [{doc_id}]")
 
+    async def delete_many(self, doc_ids: list[str]):
+        """Delete several documents from memory in one collection call."""
+        if not doc_ids:
+            return
+        self.collection.delete(ids=doc_ids)
+        if self._index is not None:
+            for doc_id in doc_ids:
+                self._index.remove(doc_id)
+        self._query_cache.clear()
+        logger.debug(f"Deleted {len(doc_ids)} documents")
+
     async def clear_all(self):
         """Clear all memories. Use with caution!"""
         self.client.delete_collection(self.collection.name)
         self.collection = self.client.get_or_create_collection(
             name="sovra_memory",
-            metadata={"description": "SOVRA long-term memory"},
+            metadata={"description": "SOVRA long-term memory", "hnsw:space": "cosine"},
         )
+        self._cosine_space = True
+        self._index = _VectorIndex(self._index_dtype, self._sketch_min_docs)
+        self._query_cache.clear()
         logger.warning("All memories cleared!")
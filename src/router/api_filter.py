@@ -11,11 +11,20 @@ import os
 import re
 from typing import Optional
 
-from dotenv import load_dotenv
-
-load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Common API key formats, in one alternation so a prompt is scanned once.
+# The specific sk- prefixes come before the generic one.
+_KEY_RE = re.compile(
+    r"sk-ant-[a-zA-Z0-9]{20,}"     # Anthropic
+    r"|sk-or-[a-zA-Z0-9]{20,}"     # OpenRouter
+    r"|sk-[a-zA-Z0-9]{20,}"        # OpenAI / Kimi
+    r"|AIza[a-zA-Z0-9_-]{35}"      # Google
+    r"|[a-f0-9]{32}"               # Generic hex keys
+)
+# All that can match when neither a "sk-" nor an "AIza" prefix is present
+_HEX_KEY_RE = re.compile(r"[a-f0-9]{32}")
+
 
 class APIFilter:
     """
@@ -31,10 +40,29 @@ class APIFilter:
         self.daily_calls = 0
         self.max_daily_calls = int(os.getenv("ROUTER_MAX_EXTERNAL_CALLS_PER_DAY", "50"))
         self.timeout = int(os.getenv("ROUTER_EXTERNAL_TIMEOUT", "30"))
-        self._client = httpx.AsyncClient(timeout=self.timeout)
+        # Only the most recent history messages are sent to paid APIs
+        self.max_history = int(os.getenv("ROUTER_MAX_HISTORY_MESSAGES", "20"))
+        # Pooled keep-alive connections over HTTP/2, so bursts of provider
+        # calls reuse TLS sessions; one retry covers transient connect errors
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=1,
+            limits=httpx.Limits(
+                max_connections=64, max_keepalive_connections=32, keepalive_expiry=300.0
+            ),
+        )
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            transport=transport,
+            headers={"User-Agent": "sovra/1"},
+        )
 
     def _load_providers(self) -> dict:
-        """Load API provider configurations from env vars."""
+        """
+        Load API provider configurations from env vars.
+        Each entry carries the method that calls it, so call() dispatches
+        without checking provider names.
+        """
         providers = {}
 
         openai_key = os.getenv("OPENAI_API_KEY", "")
@@ -43,6 +71,7 @@ class APIFilter:
                 "api_key": openai_key,
                 "base_url": os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
                 "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                "caller": self._call_openai,
             }
 
         anthropic_key = os.getenv("ANTHROPIC_API_KEY", "")
@@ -51,6 +80,7 @@ class APIFilter:
                 "api_key": anthropic_key,
                 "base_url": "https://api.anthropic.com/v1",
                 "model": os.getenv("ANTHROPIC_MODEL", "claude-3-haiku-20240307"),
+                "caller": self._call_anthropic,
             }
 
         kimi_key = os.getenv("KIMI_API_KEY", "")
@@ -59,6 +89,8 @@ class APIFilter:
                 "api_key": kimi_key,
                 "base_url": os.getenv("KIMI_API_BASE", "https://api.moonshot.cn/v1"),
                 "model": os.getenv("KIMI_MODEL", "moonshot-v1-8k"),
+                # Kimi (Moonshot) uses OpenAI-compatible API
+                "caller": self._call_openai,
             }
 
         openrouter_key = os.getenv("OPENROUTER_API_KEY", "")
@@ -67,24 +99,18 @@ class APIFilter:
                 "api_key": openrouter_key,
                 "base_url": os.getenv("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1"),
                 "model": os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3-8b-instruct"),
+                "caller": self._call_openrouter,
             }
 
         return providers
 
     def _sanitize_prompt(self, text: str) -> str:
         """Remove any API keys that might have leaked into prompts."""
-        # Pattern for common API key formats
-        patterns = [
-            r'sk-[a-zA-Z0-9]{20,}',          # OpenAI / Kimi
-            r'sk-ant-[a-zA-Z0-9]{20,}',       # Anthropic
-            r'sk-or-[a-zA-Z0-9]{20,}',        # OpenRouter
-            r'AIza[a-zA-Z0-9_-]{35}',          # Google
-            r'[a-f0-9]{32}',                    # Generic hex keys
-        ]
-        sanitized = text
-        for pattern in patterns:
-            sanitized = re.sub(pattern, '[API_KEY_REDACTED]', sanitized)
-        return sanitized
+        # Plain substring checks rule out the prefixed formats for almost
+        # every message, leaving only the hex pattern to run
+        if "sk-" not in text and "AIza" not in text:
+            return _HEX_KEY_RE.sub('[API_KEY_REDACTED]', text)
+        return _KEY_RE.sub('[API_KEY_REDACTED]', text)
 
     async def call(
         self,
@@ -105,21 +131,20 @@ class APIFilter:
         if system_prompt:
             system_prompt = self._sanitize_prompt(system_prompt)
 
+        # Build the message list once for every provider: system prompt,
+        # recent history, then the new message
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        if history and self.max_history > 0:
+            messages.extend(history[-self.max_history:])
+        messages.append({"role": "user", "content": message})
+
         # Try providers in order
         for provider_name, config in self.providers.items():
             try:
                 self.active_provider = provider_name
-                if provider_name == "openai":
-                    result = await self._call_openai(config, message, history, system_prompt)
-                elif provider_name == "anthropic":
-                    result = await self._call_anthropic(config, message, history, system_prompt)
-                elif provider_name == "kimi":
-                    # Kimi (Moonshot) uses OpenAI-compatible API
-                    result = await self._call_openai(config, message, history, system_prompt)
-                elif provider_name == "openrouter":
-                    result = await self._call_openrouter(config, message, history, system_prompt)
-                else:
-                    continue
+                result = await config["caller"](config, messages, system_prompt)
 
                 self.daily_calls += 1
                 logger.info(f"🌐 External API call #{self.daily_calls} via {provider_name}")
@@ -132,16 +157,9 @@ class APIFilter:
         raise RuntimeError("All external API providers failed.")
 
     async def _call_openai(
-        self, config: dict, message: str, history: Optional[list[dict]], system: Optional[str]
+        self, config: dict, messages: list[dict], system: Optional[str]
     ) -> str:
         """Call OpenAI-compatible API."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        if history:
-            messages.extend(history)
-        messages.append({"role": "user", "content": message})
-
         response = await self._client.post(
             f"{config['base_url']}/chat/completions",
             headers={
@@ -159,18 +177,13 @@ class APIFilter:
         return data["choices"][0]["message"]["content"]
 
     async def _call_anthropic(
-        self, config: dict, message: str, history: Optional[list[dict]], system: Optional[str]
+        self, config: dict, messages: list[dict], system: Optional[str]
     ) -> str:
-        """Call Anthropic API."""
-        messages = []
-        if history:
-            messages.extend(history)
-        messages.append({"role": "user", "content": message})
-
+        """Call Anthropic API (the system prompt is a field, not a message)."""
         payload = {
             "model": config["model"],
             "max_tokens": 4096,
-            "messages": messages,
+            "messages": messages[1:] if system else messages,
         }
         if system:
             payload["system"] = system
@@ -189,16 +202,9 @@ class APIFilter:
         return data["content"][0]["text"]
 
     async def _call_openrouter(
-        self, config: dict, message: str, history: Optional[list[dict]], system: Optional[str]
+        self, config: dict, messages: list[dict], system: Optional[str]
     ) -> str:
         """Call OpenRouter API (OpenAI-compatible with extra headers)."""
-        messages = []
-        if system:
-            messages.append({"role": "system", "content": system})
-        if history:
-            messages.extend(history)
-        messages.append({"role": "user", "content": message})
-
         response = await self._client.post(
             f"{config['base_url']}/chat/completions",
             headers={
@@ -4,6 +4,7 @@ Routes requests between local LLM, local LLM + RAG, and external APIs
 based on complexity classification by the decision engine.
 """
 
+import asyncio
 import logging
 import os
 from typing import Optional
@@ -14,6 +15,30 @@ from ..autonomy.decision_engine import DecisionEngine
 
 logger = logging.getLogger(__name__)
 
+# Most recent history messages quoted in the RAG route's system prompt
+_CONTEXT_MESSAGES = 5
+
+
+def _recent_context(history: list[dict], max_chars: int) -> str:
+    """
+    The last few messages as "role: content" lines, newest kept first, within
+    max_chars. A message longer than half the budget is cut short, so one long
+    turn can't crowd out the rest; the newest message is always included.
+    """
+    max_message = max(max_chars // 2, 1)
+    lines = []
+    used = 0
+    for m in reversed(history[-_CONTEXT_MESSAGES:]):
+        content = m["content"]
+        if len(content) > max_message:
+            content = content[:max_message] + "…"
+        line = f"{m['role']}: {content}"
+        if lines and used + len(line) > max_chars:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(reversed(lines))
+
 
 class SmartRouter:
     """
@@ -30,6 +55,7 @@ class SmartRouter:
         prompt_builder: SystemPromptBuilder,
         api_filter=None,
         rag_pipeline=None,
+        context_char_budget: Optional[int] = None,
     ):
         self.llm = llm_client
         self.decision = decision_engine
@@ -37,6 +63,16 @@ class SmartRouter:
         self.api_filter = api_filter
         self.rag = rag_pipeline
         self.stats = {"local": 0, "local_rag": 0, "external": 0}
+        # Characters of recent conversation quoted in the RAG route's prompt
+        self.context_char_budget = context_char_budget or int(
+            os.getenv("ROUTER_CONTEXT_CHAR_BUDGET", "2048")
+        )
+        # Start the local answer while the message is still being classified,
+        # discarding it if the message goes elsewhere. Costs a local
+        # generation slot for every message that isn't level 1.
+        self.speculative_local = (
+            os.getenv("ROUTER_SPECULATIVE_LOCAL", "false").lower() == "true"
+        )
 
     async def route(
         self,
@@ -48,8 +84,27 @@ class SmartRouter:
         Route a message to the appropriate handler.
         Returns: {"response": str, "route": str, "metadata": dict}
         """
+        # Start memory retrieval while the message is classified; the two
+        # don't depend on each other. If classification answers without
+        # suspending (heuristic or cache hit) the search never even starts.
+        rag_task = asyncio.create_task(self._search_context(message)) if self.rag else None
+        local_task = None
+        if self.speculative_local:
+            local_task = asyncio.create_task(
+                self._local_response(message, conversation_history, system_prompt)
+            )
+            # Retrieve its exception even when another route discards it, so
+            # a failed speculative answer isn't reported as never retrieved
+            local_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
         # Classify complexity
-        classification = await self.decision.classify_complexity(message)
+        try:
+            classification = await self._classify(message)
+        except BaseException:
+            for task in (rag_task, local_task):
+                if task is not None:
+                    task.cancel()
+            raise
         level = classification.get("level", 1)
         needs_rag = classification.get("needs_rag", False)
 
@@ -61,27 +116,80 @@ class SmartRouter:
 
         # Override: if level 2 or needs_rag, use RAG
         if level == 2 or needs_rag:
-            return await self._route_local_rag(message, conversation_history, system_prompt)
-        elif level == 3:
+            if local_task is not None:
+                local_task.cancel()
+            return await self._route_local_rag(
+                message, conversation_history, system_prompt, rag_task
+            )
+        if rag_task is not None:
+            rag_task.cancel()
+        if level == 3:
+            if local_task is not None:
+                local_task.cancel()
             return await self._route_external(message, conversation_history, system_prompt)
         else:
-            return await self._route_local(message, conversation_history, system_prompt)
+            return await self._route_local(
+                message, conversation_history, system_prompt, local_task
+            )
+
+    async def route_batch(
+        self, items: list[dict], max_concurrency: Optional[int] = None
+    ) -> list:
+        """
+        Route several independent messages concurrently.
+        Each item holds route()'s keyword arguments (message, and optionally
+        conversation_history and system_prompt). Results come back in input
+        order; a failed item yields its exception instead of a result.
+        Concurrency defaults to OLLAMA_NUM_PARALLEL, the number of requests
+        the local model server processes in parallel.
+        """
+        semaphore = asyncio.Semaphore(
+            max_concurrency or int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        )
+
+        async def route_one(item: dict) -> dict:
+            async with semaphore:
+                return await self.route(**item)
+
+        return list(
+            await asyncio.gather(*(route_one(item) for item in items), return_exceptions=True)
+        )
+
+    async def _classify(self, message: str) -> dict:
+        """
+        Classify the message. Unless heuristics or the exact-match cache decide
+        it, the message is embedded first (one request shared with the RAG
+        search) so a similar, already classified message can answer instead
+        of the LLM.
+        """
+        classification = self.decision.quick_classify(message)
+        if classification is not None:
+            return classification
+
+        embedding = None
+        if self.rag:
+            try:
+                embedding = await self.rag.embed_query(message)
+            except Exception as e:
+                logger.warning(f"Embedding for routing failed: {e}")
+        return await self.decision.classify_complexity(message, embedding=embedding)
 
     async def _route_local(
-        self, message: str, history: Optional[list[dict]], system: Optional[str]
+        self,
+        message: str,
+        history: Optional[list[dict]],
+        system: Optional[str],
+        response_task: Optional[asyncio.Task] = None,
     ) -> dict:
         """Handle through local LLM only."""
         self.stats["local"] += 1
         logger.info("📍 Route: LOCAL LLM")
 
-        if not system:
-            system = self.prompt_builder.build()
-
-        if history:
-            messages = history + [{"role": "user", "content": message}]
-            response = await self.llm.chat(messages, system=system)
+        # The answer may already be under way (speculative start)
+        if response_task is not None:
+            response = await response_task
         else:
-            response = await self.llm.generate(message, system=system)
+            response = await self._local_response(message, history, system)
 
         return {
             "response": response,
@@ -89,32 +197,60 @@ class SmartRouter:
             "metadata": {"model": self.llm.model},
         }
 
-    async def _route_local_rag(
+    async def _local_response(
         self, message: str, history: Optional[list[dict]], system: Optional[str]
+    ) -> str:
+        """Generate the local LLM's answer."""
+        if not system:
+            system = self.prompt_builder.build()
+
+        if history:
+            messages = history + [{"role": "user", "content": message}]
+            return await self.llm.chat(messages, system=system)
+        return await self.llm.generate(message, system=system)
+
+    async def _search_context(self, message: str) -> tuple[str, int]:
+        """
+        Retrieve relevant context from RAG, formatted for the system prompt.
+        Returns the context and the number of memories in it.
+        """
+        try:
+            results = await self.rag.search(message)
+            if results:
+                return "\n\n".join([f"[Memory] {r['content']}" for r in results]), len(results)
+        except Exception as e:
+            logger.warning(f"RAG retrieval failed: {e}")
+        return "", 0
+
+    async def _route_local_rag(
+        self,
+        message: str,
+        history: Optional[list[dict]],
+        system: Optional[str],
+        rag_task: Optional[asyncio.Task] = None,
     ) -> dict:
         """Handle through local LLM + RAG memory retrieval."""
-        self.stats["local_rag"] += 1
-        logger.info("📍 Route: LOCAL LLM + RAG")
-
-        # Retrieve relevant context from RAG
-        rag_context = ""
-        if self.rag:
-            try:
-                results = await self.rag.search(message)
-                if results:
-                    rag_context = "\n\n".join(
-                        [f"[Memory] {r['content']}" for r in results]
-                    )
-            except Exception as e:
-                logger.warning(f"RAG retrieval failed: {e}")
+        # Retrieve relevant context from RAG (usually already under way)
+        rag_context, rag_results = "", 0
+        if rag_task is not None:
+            rag_context, rag_results = await rag_task
+        elif self.rag:
+            rag_context, rag_results = await self._search_context(message)
 
         # Build system prompt with RAG context
         conversation_context = ""
         if history:
-            recent = history[-5:]
-            conversation_context = "\n".join(
-                [f"{m['role']}: {m['content']}" for m in recent]
-            )
+            conversation_context = _recent_context(history, self.context_char_budget)
+
+        if not rag_context and not conversation_context:
+            # Nothing to add: answer like the local route, with the canonical
+            # (cached) system prompt
+            result = await self._route_local(message, history, None)
+            result["metadata"]["fallback_from"] = "local_rag"
+            return result
+
+        self.stats["local_rag"] += 1
+        logger.info("📍 Route: LOCAL LLM + RAG")
 
         system = self.prompt_builder.build(
             rag_context=rag_context,
@@ -132,7 +268,7 @@ class SmartRouter:
             "route": "local_rag",
             "metadata": {
                 "model": self.llm.model,
-                "rag_results": len(rag_context.split("[Memory]")) - 1 if rag_context else 0,
+                "rag_results": rag_results,
             },
         }
 
@@ -4,10 +4,13 @@ Masks sensitive values (emails, API keys, passwords) before they reach the LLM.
 Unmasks them before execution so real credentials are used.
 """
 
+import asyncio
+import importlib.util
 import json
 import logging
 import os
 import re
+import threading
 from typing import Optional
 
 logger = logging.getLogger(__name__)
@@ -17,6 +20,20 @@ DEFAULT_VAULT_PATH = os.path.join(
     os.path.expanduser("~"), ".sovra", "secrets.json"
 )
 
+# Encrypted vault file: magic, Argon2id salt, then the SecretBox ciphertext
+_SEALED_MAGIC = b"SOVRA-VAULT1\n"
+_SALT_BYTES = 16
+
+# Seconds to wait after a change before writing the vault, so a burst of
+# changes is saved once
+_SAVE_DELAY = 0.25
+
+# [SECRET:NAME] placeholders left in text by mask()
+_SECRET_RE = re.compile(r"\[SECRET:([A-Z_][A-Z0-9_]*)\]")
+
+# /secret arguments: action, name, and the value (the rest, spaces included)
+_COMMAND_RE = re.compile(r"(\S*)\s*(\S*)\s*(.*)", re.DOTALL)
+
 
 class SecretVault:
     """
@@ -38,33 +55,175 @@ class SecretVault:
     def __init__(self, vault_path: Optional[str] = None):
         self.vault_path = vault_path or DEFAULT_VAULT_PATH
         self._secrets: dict[str, str] = {}
+        # Matchers over all secret values, rebuilt on the first mask() after
+        # the secrets change: an Aho-Corasick automaton with pyahocorasick,
+        # otherwise one regex alternation, longest value first
+        self._automaton = None
+        self._mask_re: Optional[re.Pattern] = None
+        self._value_placeholders: dict[str, str] = {}
+        self._matchers_stale = True
+        # name -> "[SECRET:NAME]", formatted once per change instead of per use
+        self._placeholders: dict[str, str] = {}
+        self._placeholder_length = 0
+        # Bumped on every change; the vault file holds _saved_version. Writes
+        # happen off the event loop, so a stale one must not land last.
+        self._version = 0
+        self._saved_version = 0
+        self._save_lock = threading.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # With a passphrase (and PyNaCl) the vault is encrypted at rest; the
+        # key is derived once per salt. A vault that can't be decrypted is
+        # never overwritten.
+        self._passphrase = os.getenv("SOVRA_VAULT_PASSPHRASE") or None
+        if self._passphrase and importlib.util.find_spec("nacl") is None:
+            logger.warning(
+                "SOVRA_VAULT_PASSPHRASE is set but PyNaCl isn't installed; "
+                "the vault is stored unencrypted (pip install pynacl)"
+            )
+            self._passphrase = None
+        self._salt: Optional[bytes] = None
+        self._box = None
+        self._writable = True
         self._load()
 
     def _load(self):
         """Load secrets from disk."""
         if os.path.exists(self.vault_path):
             try:
-                with open(self.vault_path, "r") as f:
-                    self._secrets = json.load(f)
+                with open(self.vault_path, "rb") as f:
+                    data = f.read()
+                if data.startswith(_SEALED_MAGIC):
+                    data = self._open_sealed(data)
+                self._secrets = json.loads(data)
                 logger.info(f"🔐 Loaded {len(self._secrets)} secrets from vault")
+            except PermissionError as e:
+                logger.error(f"🔒 Vault is locked, changes won't be saved: {e}")
+                self._secrets = {}
+                self._writable = False
             except (json.JSONDecodeError, IOError) as e:
                 logger.warning(f"Failed to load vault: {e}")
                 self._secrets = {}
         else:
             self._secrets = {}
+        self._secrets_changed()
+
+    def _make_box(self, salt: bytes):
+        """SecretBox keyed from the passphrase and salt (Argon2id)."""
+        from nacl import pwhash, secret
+
+        key = pwhash.argon2id.kdf(
+            secret.SecretBox.KEY_SIZE,
+            self._passphrase.encode(),
+            salt,
+            opslimit=pwhash.argon2id.OPSLIMIT_INTERACTIVE,
+            memlimit=pwhash.argon2id.MEMLIMIT_INTERACTIVE,
+        )
+        return secret.SecretBox(key)
+
+    def _open_sealed(self, data: bytes) -> bytes:
+        """Decrypt an encrypted vault file; PermissionError if it can't be."""
+        if not self._passphrase:
+            raise PermissionError("vault is encrypted; set SOVRA_VAULT_PASSPHRASE")
+        from nacl.exceptions import CryptoError
+
+        header = len(_SEALED_MAGIC)
+        salt = data[header : header + _SALT_BYTES]
+        box = self._make_box(salt)
+        try:
+            plaintext = box.decrypt(data[header + _SALT_BYTES :])
+        except CryptoError:
+            raise PermissionError("wrong passphrase or corrupted vault") from None
+        self._salt, self._box = salt, box
+        return plaintext
+
+    def _seal(self, plaintext: bytes) -> bytes:
+        """Encrypt vault contents, deriving the key on first use."""
+        if self._box is None:
+            from nacl.utils import random
+
+            self._salt = random(_SALT_BYTES)
+            self._box = self._make_box(self._salt)
+        return _SEALED_MAGIC + self._salt + bytes(self._box.encrypt(plaintext))
+
+    def _secrets_changed(self):
+        """Refresh what is derived from the secrets after they change."""
+        self._placeholders = {name: f"[SECRET:{name}]" for name in self._secrets}
+        self._placeholder_length = max(map(len, self._placeholders.values()), default=0)
+        self._matchers_stale = True
+
+    @property
+    def placeholder_length(self) -> int:
+        """Length of the longest current "[SECRET:NAME]" placeholder (0 if none)."""
+        return self._placeholder_length
 
     def _save(self):
         """Save secrets to disk."""
-        os.makedirs(os.path.dirname(self.vault_path), exist_ok=True)
-        with open(self.vault_path, "w") as f:
-            json.dump(self._secrets, f, indent=2)
-        logger.info(f"🔐 Saved {len(self._secrets)} secrets to vault")
+        self._write(dict(self._secrets), self._version)
+
+    def _write(self, secrets: dict[str, str], version: int):
+        """Write a snapshot (to a temp file, then swapped in), unless a newer one is saved."""
+        with self._save_lock:
+            if version <= self._saved_version:
+                return
+            data = json.dumps(secrets, indent=2).encode()
+            if self._passphrase:
+                data = self._seal(data)
+            os.makedirs(os.path.dirname(self.vault_path), exist_ok=True)
+            tmp_path = self.vault_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.vault_path)
+            self._saved_version = version
+        logger.info(f"🔐 Saved {len(secrets)} secrets to vault")
+
+    def _mark_dirty(self):
+        """
+        Schedule a save shortly after a change; changes made before it runs
+        share one write. Without a running event loop, save right away.
+        """
+        if not self._writable:
+            logger.warning("🔒 Vault is locked; the change is kept in memory only")
+            return
+        self._version += 1
+        if self._flush_task is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        """Background: write pending changes after a short delay, in a thread."""
+        try:
+            await asyncio.sleep(_SAVE_DELAY)
+            while self._saved_version != self._version:
+                await asyncio.to_thread(self._write, dict(self._secrets), self._version)
+        except OSError as e:
+            logger.warning(f"Failed to save vault: {e}")
+        finally:
+            if self._flush_task is asyncio.current_task():
+                self._flush_task = None
+
+    def flush(self):
+        """Write pending changes now (call on shutdown)."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._saved_version == self._version:
+            return
+        try:
+            self._save()
+        except OSError as e:
+            logger.warning(f"Failed to save vault: {e}")
 
     def set(self, name: str, value: str):
         """Store a secret."""
         name = name.upper().strip()
         self._secrets[name] = value
-        self._save()
+        self._secrets_changed()
+        self._mark_dirty()
         logger.info(f"🔐 Secret '{name}' stored ({len(value)} chars)")
 
     def get(self, name: str) -> Optional[str]:
@@ -76,7 +235,8 @@ class SecretVault:
         name = name.upper().strip()
         if name in self._secrets:
             del self._secrets[name]
-            self._save()
+            self._secrets_changed()
+            self._mark_dirty()
             return True
         return False
 
@@ -84,31 +244,89 @@ class SecretVault:
         """List all secret names (not values)."""
         return list(self._secrets.keys())
 
+    def _build_automaton(self):
+        """One automaton matching every secret value, or None if unavailable."""
+        try:
+            import ahocorasick
+        except ImportError:
+            return None
+        automaton = ahocorasick.Automaton()
+        for name, value in self._secrets.items():
+            # The first name stored for a value keeps it, as with str.replace
+            if value and not automaton.exists(value):
+                automaton.add_word(value, (len(value), self._placeholders[name]))
+        if not len(automaton):
+            return None
+        automaton.make_automaton()
+        return automaton
+
+    def _build_mask_re(self) -> Optional[re.Pattern]:
+        """
+        One alternation of every secret value, longest first, so at each
+        position the longest secret wins (a secret contained in another can't
+        split it). Also fills the value -> placeholder table it substitutes from.
+        """
+        self._value_placeholders = {}
+        for name, value in self._secrets.items():
+            # The first name stored for a value keeps it
+            if value:
+                self._value_placeholders.setdefault(value, self._placeholders[name])
+        if not self._value_placeholders:
+            return None
+        values = sorted(self._value_placeholders, key=len, reverse=True)
+        return re.compile("|".join(map(re.escape, values)))
+
     def mask(self, text: str) -> str:
         """
         Replace real secret values in text with [SECRET:NAME] placeholders.
         Called BEFORE sending text to LLM.
+        All secrets are found in one pass over the text, longest match first:
+        with an Aho-Corasick automaton if pyahocorasick is installed, else
+        with a single compiled alternation.
         """
-        masked = text
-        for name, value in self._secrets.items():
-            if value and value in masked:
-                masked = masked.replace(value, f"[SECRET:{name}]")
-        return masked
+        if self._matchers_stale:
+            self._automaton = self._build_automaton()
+            self._mask_re = None if self._automaton is not None else self._build_mask_re()
+            self._matchers_stale = False
+
+        if self._automaton is not None:
+            # Leftmost-longest, non-overlapping. (Automaton.iter_long would do
+            # this, but drops a match when the text ends inside a longer
+            # secret's prefix.)
+            matches = sorted(
+                (end - length + 1, -length, placeholder)
+                for end, (length, placeholder) in self._automaton.iter(text)
+            )
+            if not matches:
+                return text
+            parts = []
+            pos = 0
+            for start, neg_length, placeholder in matches:
+                if start < pos:
+                    continue
+                parts.append(text[pos:start])
+                parts.append(placeholder)
+                pos = start - neg_length
+            parts.append(text[pos:])
+            return "".join(parts)
+
+        if self._mask_re is None:
+            return text
+        placeholders = self._value_placeholders
+        return self._mask_re.sub(lambda m: placeholders[m.group(0)], text)
 
     def unmask(self, text: str) -> str:
         """
         Replace [SECRET:NAME] placeholders with real values.
         Called BEFORE executing commands.
         """
+        secrets = self._secrets
+
         def replace_placeholder(match):
-            name = match.group(1)
-            real_value = self._secrets.get(name)
-            if real_value:
-                return real_value
-            return match.group(0)  # Keep placeholder if not found
+            # Keep the placeholder if the name isn't found
+            return secrets.get(match.group(1)) or match.group(0)
 
-        pattern = r"\[SECRET:([A-Z_][A-Z0-9_]*)\]"
-        return re.sub(pattern, replace_placeholder, text)
+        return _SECRET_RE.sub(replace_placeholder, text)
 
     def handle_command(self, command_text: str) -> str:
         """
@@ -117,12 +335,8 @@ class SecretVault:
         /secret delete NAME
         /secret list
         """
-        parts = command_text.strip().split(maxsplit=2)
-
-        if len(parts) < 1:
-            return "Usage: /secret set NAME value | /secret delete NAME | /secret list"
-
-        action = parts[0].lower() if len(parts) >= 1 else ""
+        action, name, value = _COMMAND_RE.match(command_text.strip()).groups()
+        action = action.lower()
 
         if action == "list":
             names = self.list_names()
@@ -131,15 +345,12 @@ class SecretVault:
                 return f"Stored secrets:\n{items}"
             return "No secrets stored yet."
 
-        elif action == "set" and len(parts) >= 3:
-            name = parts[1]
-            value = parts[2]
+        elif action == "set" and value:
             self.set(name, value)
             masked_value = value[:3] + "***" + value[-2:] if len(value) > 5 else "***"
             return f"✅ Secret '{name.upper()}' stored: {masked_value}"
 
-        elif action == "delete" and len(parts) >= 2:
-            name = parts[1]
+        elif action == "delete" and name:
             if self.delete(name):
                 return f"🗑️ Secret '{name.upper()}' deleted."
             return f"Secret '{name.upper()}' not found."